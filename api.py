@@ -0,0 +1,375 @@
+"""
+Headless HTTP API for the chatbot.
+
+Exposes the same pipeline as the Streamlit UI (run_chat_stream + database)
+over a small aiohttp server, with assistant replies streamed back as
+Server-Sent Events.
+
+Endpoints:
+    GET    /health                       Liveness probe
+    POST   /chats                        Create a chat
+    GET    /chats?limit=&offset=&q=      List chats, newest first
+    GET    /chats/{chat_id}              Chat metadata, messages and attached files
+    POST   /chats/{chat_id}/messages     Send a message, reply streamed as SSE
+    POST   /chats/{chat_id}/files        Attach a file (multipart field "file")
+    DELETE /chats/{chat_id}/files/{hash} Detach a file
+    POST   /chats/{chat_id}/stop         Stop the chat's in-flight generation
+
+Run with:
+    python api.py --host 127.0.0.1 --port 8000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from backend import run_chat_stream, build_messages
+from cancellation import CancellationToken
+from database import (
+    create_chat, save_chat_message, save_chat_metadata, detach_document,
+    get_chat_messages, get_chat_metadata, get_chat_documents, get_chats_page,
+    generate_chat_title, transaction
+)
+from file_utils import ExtractionError, NamedBytesIO, store_upload
+
+DEFAULT_MODEL = "qwen2.5:0.5b"
+DEFAULT_TITLE = "New Chat"
+MAX_PAGE_SIZE = 100
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+# -------------------- APP STATE KEYS --------------------
+
+EXECUTOR = web.AppKey("executor", ThreadPoolExecutor)
+STREAM_SLOTS = web.AppKey("stream_slots", asyncio.Semaphore)
+ACTIVE_STREAMS = web.AppKey("active_streams", dict)
+
+# -------------------- HELPERS --------------------
+
+def _json_error(status: int, message: str) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+async def _read_json_object(request: web.Request, required: bool = True) -> Dict:
+    """
+    Parse the request body as a JSON object.
+
+    An empty body gives {} unless required. Raises HTTPBadRequest (with a
+    JSON error body) for malformed JSON or anything other than an object.
+    """
+    if not request.can_read_body:
+        if not required:
+            return {}
+        raise web.HTTPBadRequest(text=json.dumps({"error": "JSON body is required"}),
+                                 content_type="application/json")
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text=json.dumps({"error": "invalid JSON body"}),
+                                 content_type="application/json") from None
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text=json.dumps({"error": "JSON body must be an object"}),
+                                 content_type="application/json")
+    return body
+
+async def _blocking(func: Callable, *args, **kwargs):
+    """Run a blocking call (database, document text) in the default executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(func, *args, **kwargs))
+
+def _sse_event(event: str, data: Dict) -> bytes:
+    """Encode a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+def _parse_int(value: Optional[str], default: int, minimum: int, maximum: int) -> int:
+    try:
+        number = int(value) if value is not None else default
+    except ValueError:
+        number = default
+    return max(minimum, min(number, maximum))
+
+def _start_turn(chat_id: str, title: str, content: str) -> Tuple[str, List[Dict]]:
+    """
+    Save the user message and build the model input for a new turn.
+
+    Returns:
+        The chat title (generated from content for a new, untitled chat)
+        and the messages to send to the model
+    """
+    history = get_chat_messages(chat_id)
+    if not history and title == DEFAULT_TITLE:
+        title = generate_chat_title(content)
+    history.append({"role": "user", "content": content})
+    save_chat_message(chat_id, "user", content, False)
+    return title, build_messages(history, get_chat_documents(chat_id))
+
+def _finish_turn(chat_id: str, title: str, model_name: str, file_name: Optional[str],
+                 content: str, search_used: bool, stopped: bool):
+    """Save the assistant reply and the chat metadata together."""
+    with transaction():
+        save_chat_message(chat_id, "assistant", content, search_used, stopped)
+        save_chat_metadata(chat_id, title, model_name, file_name)
+
+def _stream_worker(loop: asyncio.AbstractEventLoop, queue: asyncio.Queue,
+                   cancel_token: CancellationToken, messages, chat_id: str, model_name: str,
+                   force_search: bool, enable_auto_search: bool):
+    """
+    Drive run_chat_stream on a worker thread and hand chunks to the event loop.
+
+    Queue items are ("chunk", text, search_flag), ("error", message, None)
+    and a final ("end", None, None).
+    """
+    stream = run_chat_stream(messages, chat_id, model_name,
+                             force_search=force_search,
+                             enable_auto_search=enable_auto_search,
+                             cancel_token=cancel_token)
+    try:
+        for chunk, metadata, search_flag in stream:
+            loop.call_soon_threadsafe(queue.put_nowait, ("chunk", chunk.content, search_flag))
+    except Exception as e:
+        loop.call_soon_threadsafe(queue.put_nowait, ("error", str(e), None))
+    finally:
+        stream.close()
+        loop.call_soon_threadsafe(queue.put_nowait, ("end", None, None))
+
+# -------------------- HANDLERS --------------------
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({
+        "status": "ok",
+        "active_streams": len(request.app[ACTIVE_STREAMS])
+    })
+
+async def create_chat_handler(request: web.Request) -> web.Response:
+    body = await _read_json_object(request, required=False)
+    model = body.get("model", DEFAULT_MODEL)
+    title = body.get("title") or DEFAULT_TITLE
+    chat_id = str(uuid.uuid4())
+    await _blocking(create_chat, chat_id, title, model)
+    return web.json_response(await _blocking(get_chat_metadata, chat_id), status=201)
+
+async def list_chats(request: web.Request) -> web.Response:
+    limit = _parse_int(request.query.get("limit"), 20, 1, MAX_PAGE_SIZE)
+    offset = _parse_int(request.query.get("offset"), 0, 0, 2 ** 31)
+    search = request.query.get("q") or None
+    return web.json_response(await _blocking(get_chats_page, limit, offset, search))
+
+def _load_chat(chat_id: str) -> Optional[Dict]:
+    metadata = get_chat_metadata(chat_id)
+    if metadata is not None:
+        metadata["messages"] = get_chat_messages(chat_id)
+        metadata["documents"] = get_chat_documents(chat_id)
+    return metadata
+
+async def get_chat(request: web.Request) -> web.Response:
+    chat_id = request.match_info["chat_id"]
+    metadata = await _blocking(_load_chat, chat_id)
+    if metadata is None:
+        return _json_error(404, "chat not found")
+    return web.json_response(metadata)
+
+async def upload_file(request: web.Request) -> web.Response:
+    chat_id = request.match_info["chat_id"]
+    if await _blocking(get_chat_metadata, chat_id) is None:
+        return _json_error(404, "chat not found")
+
+    reader = await request.multipart()
+    field = await reader.next()
+    while field is not None and field.name != "file":
+        field = await reader.next()
+    if field is None or not field.filename:
+        return _json_error(400, "multipart field 'file' is required")
+
+    data = bytearray()
+    while chunk := await field.read_chunk():
+        data.extend(chunk)
+        if len(data) > MAX_UPLOAD_BYTES:
+            return _json_error(413, "file too large")
+
+    upload = NamedBytesIO(bytes(data), field.filename)
+    try:
+        document = await _blocking(store_upload, chat_id, upload)
+    except ExtractionError as e:
+        return _json_error(422, str(e))
+    return web.json_response({"chat_id": chat_id, **document}, status=201)
+
+async def delete_file(request: web.Request) -> web.Response:
+    chat_id = request.match_info["chat_id"]
+    content_hash = request.match_info["content_hash"]
+    documents = await _blocking(get_chat_documents, chat_id)
+    if not any(d["content_hash"] == content_hash for d in documents):
+        return _json_error(404, "file not attached to this chat")
+    await _blocking(detach_document, chat_id, content_hash)
+    return web.json_response({"chat_id": chat_id, "content_hash": content_hash, "detached": True})
+
+async def stop_generation(request: web.Request) -> web.Response:
+    chat_id = request.match_info["chat_id"]
+    stopped = 0
+    for cancel_token, stream_chat_id in list(request.app[ACTIVE_STREAMS].items()):
+        if stream_chat_id == chat_id:
+            cancel_token.cancel("stopped")
+            stopped += 1
+    return web.json_response({"chat_id": chat_id, "stopped": stopped})
+
+async def post_message(request: web.Request) -> web.StreamResponse:
+    chat_id = request.match_info["chat_id"]
+    metadata = await _blocking(get_chat_metadata, chat_id)
+    if metadata is None:
+        return _json_error(404, "chat not found")
+
+    body = await _read_json_object(request)
+    content = body.get("content") or ""
+    if not isinstance(content, str):
+        return _json_error(400, "'content' must be a string")
+    content = content.strip()
+    if not content:
+        return _json_error(400, "'content' is required")
+
+    model_name = body.get("model") or metadata["model"] or DEFAULT_MODEL
+    force_search = bool(body.get("force_search", False))
+    enable_auto_search = bool(body.get("enable_auto_search", True))
+
+    title, messages = await _blocking(_start_turn, chat_id, metadata["title"], content)
+    file_name = metadata["file_name"]
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    await response.prepare(request)
+
+    app = request.app
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancel_token = CancellationToken()
+    full_response = ""
+    search_used = False
+    token_count = 0
+    error = None
+    started = time.perf_counter()
+    first_token_at = None
+    client_gone = False
+
+    async with app[STREAM_SLOTS]:
+        app[ACTIVE_STREAMS][cancel_token] = chat_id
+        worker = loop.run_in_executor(
+            app[EXECUTOR], _stream_worker, loop, queue, cancel_token, messages,
+            chat_id, model_name, force_search, enable_auto_search
+        )
+        try:
+            await response.write(_sse_event("start", {"chat_id": chat_id, "model": model_name}))
+            while True:
+                kind, value, search_flag = await queue.get()
+                if kind == "end":
+                    break
+                if kind == "error":
+                    error = value
+                    continue
+                search_used = search_flag
+                if value:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    full_response += value
+                    token_count += 1
+                    await response.write(_sse_event("token", {"content": value}))
+        except ConnectionResetError:
+            # Client went away: stop the model stream and keep what we have
+            client_gone = True
+            cancel_token.cancel("disconnected")
+        except asyncio.CancelledError:
+            cancel_token.cancel("disconnected")
+            raise
+        finally:
+            app[ACTIVE_STREAMS].pop(cancel_token, None)
+            # Keep the stream slot until the worker thread has finished, so
+            # new streams never queue behind a generation still draining
+            await asyncio.shield(worker)
+            stopped = cancel_token.cancelled
+            if error:
+                full_response = f"❌ Error: {error}"
+                search_used = False
+            # Shielded so the reply is still saved if the handler is cancelled
+            await asyncio.shield(_blocking(
+                _finish_turn, chat_id, title, model_name, file_name, full_response, search_used, stopped
+            ))
+
+    if client_gone:
+        return response
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "content": full_response,
+        "search_used": search_used,
+        "stopped": stopped,
+        "stop_reason": cancel_token.reason,
+        "tokens": token_count,
+        "elapsed_s": round(elapsed, 4),
+        "ttft_s": round(first_token_at - started, 4) if first_token_at else None
+    }
+    if error:
+        await response.write(_sse_event("error", {"message": error}))
+    await response.write(_sse_event("done", summary))
+    await response.write_eof()
+    return response
+
+# -------------------- APP FACTORY --------------------
+
+async def _on_shutdown(app: web.Application):
+    # Stop every in-flight generation right away; --shutdown-timeout only
+    # bounds the wait for the handlers to save their partial replies
+    for cancel_token in list(app[ACTIVE_STREAMS]):
+        cancel_token.cancel("shutdown")
+
+async def _on_cleanup(app: web.Application):
+    app[EXECUTOR].shutdown(wait=True)
+
+def create_app(max_streams: int = 32) -> web.Application:
+    """
+    Build the API application.
+
+    Args:
+        max_streams: Maximum number of concurrent model streams; further
+            requests wait for a free slot
+
+    Returns:
+        Configured aiohttp application
+    """
+    app = web.Application(client_max_size=MAX_UPLOAD_BYTES + 1024 * 1024)
+    app[EXECUTOR] = ThreadPoolExecutor(max_workers=max_streams, thread_name_prefix="chat-stream")
+    app[STREAM_SLOTS] = asyncio.Semaphore(max_streams)
+    app[ACTIVE_STREAMS] = {}
+
+    app.router.add_get("/health", health)
+    app.router.add_post("/chats", create_chat_handler)
+    app.router.add_get("/chats", list_chats)
+    app.router.add_get("/chats/{chat_id}", get_chat)
+    app.router.add_post("/chats/{chat_id}/messages", post_message)
+    app.router.add_post("/chats/{chat_id}/files", upload_file)
+    app.router.add_delete("/chats/{chat_id}/files/{content_hash}", delete_file)
+    app.router.add_post("/chats/{chat_id}/stop", stop_generation)
+
+    app.on_shutdown.append(_on_shutdown)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Universal Chatbot HTTP/SSE API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-streams", type=int, default=32,
+                        help="Maximum concurrent model streams per process")
+    parser.add_argument("--shutdown-timeout", type=float, default=30.0,
+                        help="Seconds to wait on shutdown for stopped streams to save their partial replies")
+    args = parser.parse_args()
+
+    web.run_app(create_app(args.max_streams), host=args.host, port=args.port,
+                shutdown_timeout=args.shutdown_timeout)
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,19 @@
-from typing import TypedDict, Annotated, List, Dict, Optional, Iterator
-from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
-from langchain_ollama import ChatOllama
-from langgraph.checkpoint.sqlite import SqliteSaver
-from langchain_community.tools import DuckDuckGoSearchRun
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, TypedDict, Annotated, List, Dict, Optional, Iterator
 import re
-from database import get_db_connection
+import threading
+import time
+import tracing
+import web_search
+from cancellation import CancellationToken, make_cancellable_transport, monitor
+from database import get_db_connection, get_document_text
+
+# LangChain, LangGraph and Ollama are imported on first use, not at module
+# import, so workers and tools that never stream a reply skip the cost.
+if TYPE_CHECKING:
+    from langgraph.graph.message import add_messages
+    from langchain_core.messages import BaseMessage
 
 # -------------------- STATE --------------------
 
@@ -17,7 +24,23 @@ class ChatState(TypedDict):
 
 # -------------------- WEB SEARCH SETUP --------------------
 
-search_tool = DuckDuckGoSearchRun(name="Search")
+_search_tool = None
+_search_tool_lock = threading.Lock()
+
+def get_search_tool():
+    """Get the web search tool, creating it on first use."""
+    global _search_tool
+    if _search_tool is None:
+        with _search_tool_lock:
+            if _search_tool is None:
+                from langchain_community.tools import DuckDuckGoSearchResults
+                _search_tool = DuckDuckGoSearchResults(name="Search", output_format="list", num_results=6)
+    return _search_tool
+
+def set_search_tool(tool):
+    """Replace the web search tool (any object with a run(query) method)."""
+    global _search_tool
+    _search_tool = tool
 
 # Keywords that trigger automatic search
 SEARCH_KEYWORDS = [
@@ -125,27 +148,21 @@ def should_search(query: str) -> bool:
     return False
 
 def perform_search(query: str) -> str:
-    """Perform web search and return results."""
+    """
+    Perform web search and return context for the prompt.
+
+    Runs several query variants concurrently, then dedupes, ranks and packs
+    the results into a token budget (see web_search). Returns an empty
+    string when search fails or finds nothing, so no context is injected.
+    """
     try:
-        search_query = extract_search_query(query)
-        results = search_tool.run(search_query)
-        return results
-    except Exception as e:
-        return f"Search error: {str(e)}"
+        return web_search.search(query, get_search_tool().run)
+    except Exception:
+        return ""
 
 def extract_search_query(user_query: str) -> str:
     """Extract the best search query from user input."""
-    query = user_query.lower()
-    
-    question_words = ["what is", "who is", "where is", "when did", "how to", 
-                     "tell me about", "search for", "look up", "find"]
-    
-    for qw in question_words:
-        if query.startswith(qw):
-            query = query[len(qw):].strip()
-            break
-    
-    query = query.rstrip("?").strip()
+    query = web_search.strip_question(user_query)
     return query if query else user_query
 
 # -------------------- MODEL MANAGEMENT --------------------
@@ -168,12 +185,20 @@ MODELS = {
     }
 }
 
-def get_model(model_name: str, streaming: bool = False):
-    """Get or create a model instance."""
+def get_model(model_name: str, streaming: bool = False,
+              cancel_token: Optional[CancellationToken] = None):
+    """Get or create a model instance; cancel_token aborts its HTTP requests."""
+    from langchain_ollama import ChatOllama
+
+    # The transport is synchronous, so it only goes to the sync client
+    sync_client_kwargs = {}
+    if cancel_token is not None:
+        sync_client_kwargs["transport"] = make_cancellable_transport(cancel_token)
     return ChatOllama(
         model=model_name,
         temperature=0.3,
-        streaming=streaming
+        streaming=streaming,
+        sync_client_kwargs=sync_client_kwargs
     )
 
 def get_model_emoji(model_name: str) -> str:
@@ -185,13 +210,52 @@ def get_model_emoji(model_name: str) -> str:
 
 # -------------------- GRAPH --------------------
 
-checkpointer = SqliteSaver(get_db_connection())
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+def get_checkpointer():
+    """Get the LangGraph SQLite checkpointer, creating it on first use."""
+    global _checkpointer
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                from langgraph.checkpoint.sqlite import SqliteSaver
+                _checkpointer = SqliteSaver(get_db_connection())
+    return _checkpointer
+
+# -------------------- MESSAGE BUILDING --------------------
+
+def build_messages(history: List[Dict], documents: Optional[List[Dict]] = None) -> List[BaseMessage]:
+    """
+    Convert stored chat history into LangChain messages.
+
+    Args:
+        history: Messages as dicts with "role" and "content" keys
+        documents: Attached documents as returned by get_chat_documents; their
+            text is loaded from the document store here, when the prompt is built
+
+    Returns:
+        List of messages ready for run_chat_stream
+    """
+    from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+
+    messages = []
+    for doc in documents or []:
+        text = get_document_text(doc["content_hash"])
+        if text:
+            messages.append(SystemMessage(content=f"The user has uploaded a file named '{doc['file_name']}'. Use its content to answer their questions.\n\nFILE CONTENT:\n{text}"))
+    for msg in history:
+        if msg["role"] == "user":
+            messages.append(HumanMessage(content=msg["content"]))
+        else:
+            messages.append(AIMessage(content=msg["content"]))
+    return messages
 
 # -------------------- STREAMING RUN FUNCTION --------------------
 
 def run_chat_stream(messages: List[BaseMessage], thread_id: str, model_name: str,
                    force_search: bool = False, enable_auto_search: bool = True,
-                   max_tokens: int = 2000):
+                   max_tokens: int = 2000, cancel_token: Optional[CancellationToken] = None):
     """
     Run chat with streaming and optional web search.
     
@@ -202,73 +266,128 @@ def run_chat_stream(messages: List[BaseMessage], thread_id: str, model_name: str
         force_search: Force web search regardless of content
         enable_auto_search: Enable automatic search detection
         max_tokens: Maximum tokens to prevent infinite loops
+        cancel_token: Stops generation and closes the Ollama connection when
+            cancelled; the caller checks cancel_token.cancelled afterwards
     
     Yields:
         Streaming chunks and metadata
     """
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    trace = tracing.start_trace("chat.turn", model=model_name)
+    
     # Determine if search is needed
     needs_search = force_search
+    token_count = 0
+    first_chunk_at = None
+    stream = None
+    if cancel_token is not None:
+        monitor.register(cancel_token)
     
-    if not needs_search and enable_auto_search:
-        for msg in reversed(messages):
-            if isinstance(msg, HumanMessage):
-                needs_search = should_search(msg.content)
-                break
-    
-    # Perform search if needed
-    search_results = None
-    if needs_search:
-        for msg in reversed(messages):
-            if isinstance(msg, HumanMessage):
-                search_results = perform_search(msg.content)
-                break
-    
-    # Prepare messages with search context if available
-    final_messages = messages.copy()
-    if search_results:
-        search_context = SystemMessage(
-            content=f"""You have access to current web search results. Use this information to answer the user's question accurately.
+    try:
+        if not needs_search and enable_auto_search:
+            with trace.span("chat.search_decision"):
+                for msg in reversed(messages):
+                    if isinstance(msg, HumanMessage):
+                        needs_search = should_search(msg.content)
+                        break
+        
+        # Perform search if needed
+        search_results = None
+        if needs_search:
+            with trace.span("chat.search"):
+                for msg in reversed(messages):
+                    if isinstance(msg, HumanMessage):
+                        search_results = perform_search(msg.content)
+                        break
+        
+        # Prepare messages with search context if available
+        final_messages = messages.copy()
+        if search_results:
+            search_context = SystemMessage(
+                content=f"""You have access to current web search results. Use this information to answer the user's question accurately.
 
 SEARCH RESULTS:
 {search_results}
 
 Important: 
 - Use the search results to provide up-to-date information
-- Cite sources when possible (mention "According to recent sources" or similar)
+- Cite sources when possible by their [number] or URL
 - If search results are not relevant, acknowledge this and use your knowledge
 - Be concise and accurate
 """
-        )
-        final_messages.insert(-1, search_context)
-    
-    # Direct streaming with loop detection
-    model = get_model(model_name, streaming=True)
-    
-    token_count = 0
-    last_chunks = []
-    repetition_threshold = 50  # Number of characters to check for repetition
-    
-    for chunk in model.stream(final_messages):
-        # Check for infinite loop (repetitive content)
-        if chunk.content:
-            last_chunks.append(chunk.content)
-            
-            # Keep only last few chunks for comparison
-            if len(last_chunks) > 20:
-                last_chunks.pop(0)
+            )
+            final_messages.insert(-1, search_context)
+        
+        if cancel_token is not None and cancel_token.cancelled:
+            return
+        
+        # Direct streaming with loop detection
+        with trace.span("chat.model_init"):
+            model = get_model(model_name, streaming=True, cancel_token=cancel_token)
+        
+        last_chunks = []
+        repetition_threshold = 50  # Number of characters to check for repetition
+        
+        # Prefill: request start to first chunk; stream: first chunk to end
+        stream_start = time.perf_counter()
+        
+        stream = model.stream(final_messages)
+        for chunk in _until_cancelled(stream, cancel_token):
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+                trace.add("chat.prefill", stream_start, first_chunk_at - stream_start)
             
-            # Check for repetition
-            recent_text = "".join(last_chunks[-10:]) if len(last_chunks) >= 10 else ""
-            if len(recent_text) > repetition_threshold:
-                # Check if last part repeats
-                half = len(recent_text) // 2
-                if recent_text[:half] == recent_text[half:2*half]:
-                    # Detected repetition, stop generation
+            # Check for infinite loop (repetitive content)
+            if chunk.content:
+                last_chunks.append(chunk.content)
+                
+                # Keep only last few chunks for comparison
+                if len(last_chunks) > 20:
+                    last_chunks.pop(0)
+                
+                # Check for repetition
+                recent_text = "".join(last_chunks[-10:]) if len(last_chunks) >= 10 else ""
+                if len(recent_text) > repetition_threshold:
+                    # Check if last part repeats
+                    half = len(recent_text) // 2
+                    if recent_text[:half] == recent_text[half:2*half]:
+                        # Detected repetition, stop generation
+                        break
+                
+                # Stop if max tokens reached
+                token_count += 1
+                if token_count > max_tokens:
                     break
             
-            # Stop if max tokens reached
-            token_count += 1
-            if token_count > max_tokens:
-                break
-        
-        yield chunk, {}, needs_search
+            if cancel_token is not None:
+                cancel_token.suspend()
+                yield chunk, {}, needs_search
+                cancel_token.resume()
+            else:
+                yield chunk, {}, needs_search
+    finally:
+        if stream is not None:
+            stream.close()
+        if cancel_token is not None:
+            monitor.unregister(cancel_token)
+        if first_chunk_at is not None:
+            trace.add("chat.stream", first_chunk_at, time.perf_counter() - first_chunk_at)
+        trace.set(tokens=token_count, search=needs_search,
+                  cancelled=cancel_token is not None and cancel_token.cancelled)
+        trace.finish()
+
+def _until_cancelled(stream, cancel_token: Optional[CancellationToken]):
+    """Iterate a model stream, stopping quietly once cancel_token is cancelled."""
+    if cancel_token is None:
+        yield from stream
+        return
+    try:
+        for chunk in stream:
+            if cancel_token.cancelled:
+                return
+            yield chunk
+    except Exception:
+        # Cancelling shuts the connection down under the reader
+        if not cancel_token.cancelled:
+            raise
@@ -0,0 +1,422 @@
+"""
+Offline batch inference over a JSONL prompt file.
+
+Runs each prompt through the same pipeline as the UI (run_chat_stream) with
+a bounded number of concurrent generations per model, and appends one
+result line per prompt to the output file as soon as it finishes.
+
+Input, one JSON object per line ("prompt" is required; "id" defaults to
+"line-<n>"; "history" holds earlier turns as {"role", "content"} dicts;
+optional "model", "force_search", "auto_search", "max_tokens", "title"):
+    {"id": "q1", "prompt": "What is RAG?", "model": "llama3.2:1b"}
+    {"id": "q2", "prompt": "Summarize it", "history": [...], "force_search": false}
+
+Output, one JSON object per line:
+    {"id": "q1", "model": "llama3.2:1b", "status": "ok", "response": "...",
+     "tokens": 57, "ttft_s": 0.21, "elapsed_s": 1.93, "tokens_per_s": 33.1, ...}
+
+Re-running the same command resumes: prompts whose id is already in the
+output file are skipped. Ctrl+C stops in-flight generations without
+recording them, so they run again on resume.
+
+Run with:
+    python batch.py prompts.jsonl results.jsonl --concurrency 4
+    python batch.py prompts.jsonl results.jsonl --model-concurrency llama3.1:8b=1 --save-chats
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set
+
+from backend import run_chat_stream, build_messages
+from cancellation import CancellationToken
+from database import (
+    create_chat, delete_chat, get_chat_metadata, save_chat_message,
+    save_chat_metadata, generate_chat_title, transaction
+)
+
+# -------------------- CONFIGURATION --------------------
+
+DEFAULT_MODEL = "qwen2.5:0.5b"
+DEFAULT_CONCURRENCY = 4
+
+# Prompts submitted to a model's pool ahead of the running ones, per worker
+PENDING_PER_SLOT = 2
+# Prompts read past a model whose pool is full, across all models. The
+# input file is streamed, so this bounds memory; the reader only blocks
+# once this many prompts are waiting.
+MAX_BACKLOG = 1000
+
+# -------------------- INPUT & RESUME --------------------
+
+def read_prompts(path: str) -> Iterator[Dict]:
+    """
+    Stream prompt records from a JSONL file.
+
+    Yields dicts with at least "id" and "prompt"; lines that are not valid
+    prompt records are yielded with an "invalid" message instead.
+    """
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"id": f"line-{lineno}", "invalid": f"invalid JSON: {e}"}
+                continue
+            if not isinstance(item, dict) or not str(item.get("prompt") or "").strip():
+                yield {"id": f"line-{lineno}", "invalid": "'prompt' is required"}
+                continue
+            item.setdefault("id", f"line-{lineno}")
+            item["id"] = str(item["id"])
+            yield item
+
+def completed_ids(path: str, retry_errors: bool = False) -> Set[str]:
+    """Ids already recorded in an output file (the last record per id wins)."""
+    statuses: Dict[str, str] = {}
+    if not os.path.exists(path):
+        return set()
+    # A killed write can leave half a UTF-8 character at the end of the file
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by an interruption
+            statuses[str(record.get("id"))] = record.get("status")
+    return {i for i, status in statuses.items() if not (retry_errors and status == "error")}
+
+class ResultWriter:
+    """Thread-safe, line-buffered appender for result records."""
+
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        # Start on a fresh line if the last run was killed mid-write. The
+        # last byte is checked in binary mode, since a text read from the
+        # middle of a multi-byte character would fail to decode.
+        with open(path, "ab+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+# -------------------- GENERATION --------------------
+
+def run_prompt(item: Dict, model_name: str, thread_id: str, cancel_token: CancellationToken,
+               auto_search: bool = True) -> Dict:
+    """
+    Generate a reply for one prompt record.
+
+    Returns:
+        Result record with the reply, status ("ok", "error", "stopped" or
+        "timeout"), token counts and timings
+    """
+    history = [{"role": m["role"], "content": m["content"]} for m in item.get("history") or []]
+    history.append({"role": "user", "content": item["prompt"]})
+
+    started_at = datetime.now().isoformat(timespec="seconds")
+    started = time.perf_counter()
+    first = None
+    response = ""
+    tokens = 0
+    usage = None
+    search_used = False
+    error = None
+    try:
+        stream = run_chat_stream(
+            build_messages(history), thread_id, model_name,
+            force_search=bool(item.get("force_search", False)),
+            enable_auto_search=bool(item.get("auto_search", auto_search)),
+            max_tokens=int(item.get("max_tokens", 2000)),
+            cancel_token=cancel_token
+        )
+        for chunk, metadata, search_flag in stream:
+            search_used = search_flag
+            if chunk.content:
+                if first is None:
+                    first = time.perf_counter()
+                response += chunk.content
+                tokens += 1
+            usage = getattr(chunk, "usage_metadata", None) or usage
+    except Exception as e:
+        error = str(e)
+    elapsed = time.perf_counter() - started
+
+    if error:
+        status = "error"
+    elif cancel_token.cancelled:
+        status = "timeout" if cancel_token.reason == "timeout" else "stopped"
+    else:
+        status = "ok"
+    stream_time = elapsed - (first - started) if first else 0
+    return {
+        "id": item["id"],
+        "model": model_name,
+        "status": status,
+        "error": error,
+        "prompt": item["prompt"],
+        "response": response,
+        "search_used": search_used,
+        "tokens": tokens,
+        "prompt_tokens": usage.get("input_tokens") if usage else None,
+        "completion_tokens": usage.get("output_tokens") if usage else None,
+        "ttft_s": round(first - started, 4) if first else None,
+        "elapsed_s": round(elapsed, 4),
+        "tokens_per_s": round(tokens / stream_time, 2) if stream_time > 0 else None,
+        "started_at": started_at
+    }
+
+def batch_chat_id(batch_name: str, prompt_id: str) -> str:
+    """
+    Chat id for a prompt of a batch.
+
+    Derived from the batch name and prompt id, so a prompt re-run on resume
+    replaces its chat instead of adding a duplicate.
+    """
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"chatbot-batch:{batch_name}/{prompt_id}"))
+
+def persist_result(chat_id: str, item: Dict, result: Dict):
+    """Save a prompt (with any history) and its result as a chat, in one transaction."""
+    title = generate_chat_title(item.get("title") or item["prompt"])
+    reply = result["response"] if result["status"] != "error" else f"❌ Error: {result['error']}"
+    with transaction():
+        if get_chat_metadata(chat_id) is not None:
+            delete_chat(chat_id)
+        create_chat(chat_id, title, result["model"])
+        for msg in item.get("history") or []:
+            save_chat_message(chat_id, msg["role"], msg["content"])
+        save_chat_message(chat_id, "user", item["prompt"])
+        save_chat_message(chat_id, "assistant", reply, result["search_used"], result["status"] in ("stopped", "timeout"))
+        save_chat_metadata(chat_id, title, result["model"])
+
+# -------------------- BATCH RUNNER --------------------
+
+def run_batch(input_path: str, output_path: str, concurrency: int = DEFAULT_CONCURRENCY,
+              model_concurrency: Optional[Dict[str, int]] = None, default_model: str = DEFAULT_MODEL,
+              auto_search: bool = True, save_chats: bool = False, batch_name: Optional[str] = None,
+              retry_errors: bool = False, timeout_s: Optional[float] = None,
+              progress: bool = False) -> Dict:
+    """
+    Run every not-yet-completed prompt of input_path, appending results to output_path.
+
+    Args:
+        input_path: JSONL prompt file
+        output_path: JSONL result file; existing results are kept and skipped
+        concurrency: Concurrent generations per model
+        model_concurrency: Per-model overrides of concurrency
+        default_model: Model for prompts without a "model" field
+        auto_search: Default for prompts without an "auto_search" field
+        save_chats: Also store each result as a chat in the database
+        batch_name: Namespace for saved chat ids (default: input file name)
+        retry_errors: Re-run prompts whose recorded status is "error"
+        timeout_s: Per-prompt time limit; late generations are cancelled
+        progress: Print one line per finished prompt to stderr
+
+    Returns:
+        Summary with counts, tokens, wall time and latency percentiles
+    """
+    model_concurrency = model_concurrency or {}
+    batch_name = batch_name or os.path.basename(input_path)
+    done = completed_ids(output_path, retry_errors)
+    writer = ResultWriter(output_path)
+
+    # Each model has its own pool (its worker count bounds concurrency for
+    # that model), a limit on prompts submitted to it, and a backlog of
+    # prompts read while it was full. A slow model therefore only holds
+    # back its own prompts while the reader keeps feeding the others.
+    models: Dict[str, Dict] = {}
+    in_flight: Dict[str, CancellationToken] = {}
+    lock = threading.Lock()
+    idle = threading.Condition(lock)
+    backlog_space = threading.Semaphore(MAX_BACKLOG)
+    interrupted = threading.Event()
+    summary = {"skipped": 0, "ok": 0, "error": 0, "stopped": 0, "timeout": 0, "invalid": 0,
+               "save_errors": 0, "tokens": 0}
+    latencies: List[float] = []
+
+    def record(result: Dict):
+        writer.write(result)
+        with lock:
+            summary[result["status"]] += 1
+            summary["tokens"] += result.get("tokens") or 0
+            summary["save_errors"] += "save_error" in result
+            if result.get("elapsed_s") is not None:
+                latencies.append(result["elapsed_s"])
+        if progress:
+            print(f"[{result['status']}] {result['id']} {result.get('model') or ''} "
+                  f"{result.get('tokens') or 0} tokens {result.get('elapsed_s') or 0:.2f}s", file=sys.stderr)
+
+    def work(item: Dict, model_name: str, token: CancellationToken):
+        timer = None
+        try:
+            if interrupted.is_set():
+                return
+            if timeout_s:
+                timer = threading.Timer(timeout_s, token.cancel, ["timeout"])
+                timer.daemon = True
+                timer.start()
+            chat_id = batch_chat_id(batch_name, item["id"]) if save_chats else str(uuid.uuid4())
+            result = run_prompt(item, model_name, chat_id, token, auto_search)
+            if token.reason == "interrupted":
+                return  # not recorded, so it runs again on resume
+            if save_chats:
+                # A failed save must not turn a finished generation into an error
+                try:
+                    persist_result(chat_id, item, result)
+                    result["chat_id"] = chat_id
+                except Exception as e:
+                    result["save_error"] = str(e)
+            record(result)
+        except Exception as e:
+            record({"id": item["id"], "model": model_name, "status": "error", "error": str(e),
+                    "prompt": item["prompt"], "response": "", "tokens": 0})
+        finally:
+            if timer is not None:
+                timer.cancel()
+            with lock:
+                in_flight.pop(item["id"], None)
+                state = models[model_name]
+                state["submitted"] -= 1
+                if state["backlog"] and not interrupted.is_set():
+                    submit(state["backlog"].popleft(), model_name)
+                    backlog_space.release()
+                idle.notify_all()
+
+    def submit(item: Dict, model_name: str):
+        # Called with lock held
+        state = models[model_name]
+        state["submitted"] += 1
+        token = in_flight[item["id"]] = CancellationToken()
+        state["pool"].submit(work, item, model_name, token)
+
+    def dispatch(item: Dict, model_name: str):
+        with lock:
+            state = models.get(model_name)
+            if state is None:
+                workers = model_concurrency.get(model_name, concurrency)
+                state = models[model_name] = {
+                    "pool": ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"batch-{model_name}"),
+                    "limit": workers * PENDING_PER_SLOT,
+                    "submitted": 0,
+                    "backlog": deque()
+                }
+            if state["submitted"] < state["limit"]:
+                submit(item, model_name)
+                return
+        backlog_space.acquire()
+        with lock:
+            if state["submitted"] < state["limit"]:
+                submit(item, model_name)
+                backlog_space.release()
+            else:
+                state["backlog"].append(item)
+
+    started = time.perf_counter()
+    try:
+        for item in read_prompts(input_path):
+            if item["id"] in done:
+                summary["skipped"] += 1
+                continue
+            done.add(item["id"])
+            if "invalid" in item:
+                record({"id": item["id"], "status": "invalid", "error": item["invalid"]})
+                continue
+            dispatch(item, item.get("model") or default_model)
+        with lock:
+            idle.wait_for(lambda: all(not s["submitted"] and not s["backlog"] for s in models.values()))
+        for state in models.values():
+            state["pool"].shutdown(wait=True)
+    except KeyboardInterrupt:
+        with lock:
+            interrupted.set()
+            for state in models.values():
+                state["backlog"].clear()
+            tokens = list(in_flight.values())
+        for token in tokens:
+            token.cancel("interrupted")
+        for state in models.values():
+            state["pool"].shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        writer.close()
+
+    wall = time.perf_counter() - started
+    latencies.sort()
+    summary.update({
+        "wall_s": round(wall, 3),
+        "tokens_per_s": round(summary["tokens"] / wall, 2) if wall > 0 else None,
+        "p50_s": latencies[len(latencies) // 2] if latencies else None,
+        "p95_s": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+    })
+    return summary
+
+def _parse_model_concurrency(values: List[str]) -> Dict[str, int]:
+    limits = {}
+    for value in values:
+        model, sep, limit = value.rpartition("=")
+        if not sep or not model or not limit.isdigit() or int(limit) < 1:
+            raise argparse.ArgumentTypeError(f"expected MODEL=N, got {value!r}")
+        limits[model] = int(limit)
+    return limits
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL prompt file through the chat pipeline")
+    parser.add_argument("input", help="JSONL prompt file")
+    parser.add_argument("output", help="JSONL result file (appended to; existing ids are skipped)")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Model for prompts without a \"model\" field")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Concurrent generations per model")
+    parser.add_argument("--model-concurrency", action="append", default=[], metavar="MODEL=N",
+                        help="Per-model concurrency override (repeatable)")
+    parser.add_argument("--no-auto-search", action="store_true",
+                        help="Disable automatic web search unless a prompt sets \"auto_search\"")
+    parser.add_argument("--timeout", type=float, default=None, help="Per-prompt time limit in seconds")
+    parser.add_argument("--save-chats", action="store_true", help="Also store each result as a chat")
+    parser.add_argument("--batch-name", help="Namespace for saved chat ids (default: input file name)")
+    parser.add_argument("--retry-errors", action="store_true", help="Re-run prompts that previously failed")
+    parser.add_argument("--quiet", action="store_true", help="No per-prompt progress lines")
+    args = parser.parse_args()
+
+    try:
+        model_concurrency = _parse_model_concurrency(args.model_concurrency)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    try:
+        summary = run_batch(
+            args.input, args.output, args.concurrency, model_concurrency, args.model,
+            auto_search=not args.no_auto_search, save_chats=args.save_chats,
+            batch_name=args.batch_name, retry_errors=args.retry_errors,
+            timeout_s=args.timeout, progress=not args.quiet
+        )
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume.", file=sys.stderr)
+        sys.exit(130)
+    print(json.dumps(summary))
+    if summary["error"] or summary["invalid"] or summary["save_errors"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
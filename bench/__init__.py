@@ -0,0 +1,8 @@
+"""
+Benchmark and load-test suite.
+
+Run from the repository root, e.g.:
+    python -m bench.micro
+    python -m bench.load --sessions 20 --turns 3
+    python -m bench.compare results/old.json results/new.json
+"""
@@ -0,0 +1,78 @@
+"""
+Batch runner benchmark against a fake Ollama server.
+
+Writes a synthetic prompt file, runs it through batch.run_batch at several
+concurrency levels and reports wall time, throughput, per-prompt latency
+and the peak number of concurrent model requests the server saw (which
+must not exceed concurrency x models, as the limit applies per model).
+
+    python -m bench.batch --prompts 200 --concurrency 1 4 16
+    python -m bench.batch --models 2 --tokens-per-sec 50 --save-chats
+"""
+
+import argparse
+import json
+import os
+import time
+
+from bench.common import use_temp_database, write_results
+from bench.fake_ollama import FakeOllama
+from bench.micro import PROMPTS
+
+def write_prompts(path: str, count: int, models: int):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps({
+                "id": f"p{i}",
+                "prompt": PROMPTS[i % len(PROMPTS)],
+                "model": f"bench-model-{i % models}"
+            }) + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch runner benchmark")
+    parser.add_argument("--prompts", type=int, default=100)
+    parser.add_argument("--models", type=int, default=1, help="Distinct models the prompts are spread over")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16],
+                        help="Per-model concurrency levels to run")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--first-token-ms", type=float, default=50.0)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--save-chats", action="store_true", help="Also persist every result as a chat")
+    parser.add_argument("--output", help="Result JSON path (default: bench/results/)")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    workdir = use_temp_database()
+    prompts_path = os.path.join(workdir, "prompts.jsonl")
+    write_prompts(prompts_path, args.prompts, args.models)
+
+    with FakeOllama(tokens_per_sec=args.tokens_per_sec, first_token_ms=args.first_token_ms,
+                    tokens=args.tokens) as server:
+        os.environ["OLLAMA_HOST"] = server.url
+        import batch
+
+        results = {}
+        for concurrency in args.concurrency:
+            results_path = os.path.join(workdir, f"results-c{concurrency}.jsonl")
+            server.max_active = 0
+            summary = batch.run_batch(prompts_path, results_path, concurrency,
+                                      auto_search=False, save_chats=args.save_chats,
+                                      batch_name=f"bench-c{concurrency}")
+            summary["max_concurrent_requests"] = server.max_active
+
+            # A second run over the finished output must skip everything
+            start = time.perf_counter()
+            resumed = batch.run_batch(prompts_path, results_path, concurrency, auto_search=False)
+            summary["resume_noop_s"] = round(time.perf_counter() - start, 4)
+            summary["resume_skipped"] = resumed["skipped"]
+            results[f"concurrency_{concurrency}"] = summary
+
+            print(f"concurrency={concurrency:<3} wall={summary['wall_s']:7.2f}s  "
+                  f"tokens/s={summary['tokens_per_s']:9.1f}  p50={summary['p50_s']:.3f}s  "
+                  f"p95={summary['p95_s']:.3f}s  peak requests={server.max_active}  "
+                  f"ok={summary['ok']} errors={summary['error']}  resume skipped={resumed['skipped']}")
+
+    print(f"Results written to {write_results('batch', results, output)}")
+
+if __name__ == "__main__":
+    main()
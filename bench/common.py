@@ -0,0 +1,80 @@
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# -------------------- STATISTICS --------------------
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile; None for an empty sample."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize(values: List[float]) -> Dict:
+    """Summary statistics for a list of measurements."""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "min": min(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values)
+    }
+
+def time_call(func, *args, repeat: int = 1000, **kwargs) -> Dict:
+    """Time repeated calls of func, returning per-call seconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+# -------------------- ENVIRONMENT --------------------
+
+def use_temp_database() -> str:
+    """
+    Point the app's SQLite database at a throwaway file.
+
+    Must run before the database is first used; the path is read from
+    CHATBOT_DB when `database` is imported.
+    """
+    workdir = tempfile.mkdtemp(prefix="chatbot-bench-")
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if repo_root not in sys.path:
+        sys.path.insert(0, repo_root)
+    os.environ["CHATBOT_DB"] = os.path.join(workdir, "chat_memory.db")
+    return workdir
+
+def environment() -> Dict:
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.now().isoformat(timespec="seconds")
+    }
+
+# -------------------- RESULTS --------------------
+
+def write_results(name: str, results: Dict, output: Optional[str] = None) -> str:
+    """Write benchmark results as JSON and return the file path."""
+    if output is None:
+        results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+        os.makedirs(results_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(results_dir, f"{name}-{stamp}.json")
+    payload = {"benchmark": name, "environment": environment(), "results": results}
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    return output
@@ -0,0 +1,73 @@
+"""
+Compare two benchmark result files.
+
+Walks both JSON result trees and prints every latency statistic present
+in both, with the relative change. Statistics come from summary blocks
+(p50/p95/p99/mean next to a count) and from plain numbers whose key ends
+in _s or _ms (e.g. wall_s, p50_s, median_ms). Lower is better for
+timings; higher is better for rates (metrics named *per_s* / *per_sec*).
+
+    python -m bench.compare bench/results/before.json bench/results/after.json
+"""
+
+import argparse
+import json
+from typing import Dict, Iterator, Tuple
+
+STATS = ("p50", "p95", "p99", "mean")
+
+def _is_rate(path: str) -> bool:
+    return "per_s" in path
+
+def _walk(node, path: str = "") -> Iterator[Tuple[str, float]]:
+    if isinstance(node, dict):
+        if "count" in node:
+            for stat in STATS:
+                if isinstance(node.get(stat), (int, float)):
+                    yield f"{path}.{stat}", node[stat]
+            return
+        for key, value in node.items():
+            child = f"{path}.{key}" if path else key
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                yield from _walk(value, child)
+            elif key.endswith("_ms"):
+                yield child, value / 1000
+            elif key.endswith("_s") or key.endswith("_sec"):
+                yield child, value
+
+def compare(before: Dict, after: Dict) -> Dict[str, Tuple[float, float, float]]:
+    """Map metric path -> (before, after, relative change)."""
+    old = dict(_walk(before["results"]))
+    new = dict(_walk(after["results"]))
+    rows = {}
+    for path in old:
+        if path in new:
+            change = (new[path] - old[path]) / old[path] if old[path] else 0.0
+            rows[path] = (old[path], new[path], change)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.0,
+                        help="Only show metrics whose relative change exceeds this (e.g. 0.05)")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+
+    for path, (old, new, change) in compare(before, after).items():
+        if abs(change) < args.threshold:
+            continue
+        if _is_rate(path):
+            marker = "better" if change > 0 else "worse"
+            print(f"{path:<50} {old:12.1f}/s -> {new:12.1f}/s  {change:+7.1%} {marker}")
+        else:
+            marker = "slower" if change > 0 else "faster"
+            print(f"{path:<50} {old * 1000:10.3f}ms -> {new * 1000:10.3f}ms  {change:+7.1%} {marker}")
+
+if __name__ == "__main__":
+    main()
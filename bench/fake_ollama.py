@@ -0,0 +1,180 @@
+"""
+Fake Ollama HTTP server for benchmarks and end-to-end checks.
+
+Implements the subset of the Ollama API that ChatOllama uses
+(/api/chat, streaming and non-streaming) plus /api/tags and /api/version.
+Replies are synthetic tokens emitted at a configurable rate after a
+configurable first-token latency, so runs are reproducible and do not
+need a model or GPU.
+
+Standalone:
+    python -m bench.fake_ollama --port 11435 --tokens-per-sec 50 --first-token-ms 200
+    OLLAMA_HOST=http://127.0.0.1:11435 python api.py
+
+In-process:
+    server = FakeOllama(tokens_per_sec=200).start()
+    os.environ["OLLAMA_HOST"] = server.url
+    ...
+    server.stop()
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+from aiohttp import web
+
+WORDS = ("the quick brown fox jumps over the lazy dog while local models "
+         "stream tokens to patient users on modest hardware").split()
+
+class FakeOllama:
+    """Ollama-compatible token streamer running on its own event loop thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 tokens_per_sec: float = 100.0, first_token_ms: float = 50.0,
+                 tokens: int = 64, jitter: float = 0.0, seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.tokens_per_sec = tokens_per_sec
+        self.first_token_ms = first_token_ms
+        self.tokens = tokens
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    # -------------------- HTTP HANDLERS --------------------
+
+    def _delay(self, base: float) -> float:
+        if self.jitter:
+            base *= 1 + self.random.uniform(-self.jitter, self.jitter)
+        return max(0.0, base)
+
+    def _message(self, model: str, content: str, done: bool) -> dict:
+        payload = {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": content},
+            "done": done
+        }
+        if done:
+            payload.update({
+                "done_reason": "stop",
+                "total_duration": 0,
+                "prompt_eval_count": 0,
+                "eval_count": self.tokens
+            })
+        return payload
+
+    def _token(self, index: int) -> str:
+        return WORDS[index % len(WORDS)] + " "
+
+    async def _chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        model = body.get("model", "fake")
+        self.requests += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self._delay(self.first_token_ms / 1000))
+            interval = 1 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0
+
+            if not body.get("stream", True):
+                await asyncio.sleep(self._delay(interval * (self.tokens - 1)))
+                text = "".join(self._token(i) for i in range(self.tokens))
+                return web.json_response(self._message(model, text, True))
+
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            for i in range(self.tokens):
+                if i:
+                    await asyncio.sleep(self._delay(interval))
+                line = json.dumps(self._message(model, self._token(i), False)) + "\n"
+                await response.write(line.encode("utf-8"))
+            await response.write((json.dumps(self._message(model, "", True)) + "\n").encode("utf-8"))
+            await response.write_eof()
+            return response
+        except ConnectionResetError:
+            return web.Response(status=499)
+        finally:
+            self.active -= 1
+
+    async def _tags(self, request: web.Request) -> web.Response:
+        return web.json_response({"models": [{"name": "fake", "model": "fake"}]})
+
+    async def _version(self, request: web.Request) -> web.Response:
+        return web.json_response({"version": "0.0.0-fake"})
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/chat", self._chat)
+        app.router.add_get("/api/tags", self._tags)
+        app.router.add_get("/api/version", self._version)
+        return app
+
+    # -------------------- LIFECYCLE --------------------
+
+    async def _serve(self):
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._ready.set()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._serve())
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def start(self) -> "FakeOllama":
+        """Start serving on a background thread and wait until bound."""
+        self._thread = threading.Thread(target=self._run, name="fake-ollama", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def __enter__(self) -> "FakeOllama":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens-per-sec", type=float, default=100.0)
+    parser.add_argument("--first-token-ms", type=float, default=50.0)
+    parser.add_argument("--tokens", type=int, default=64, help="Tokens per reply")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Relative random jitter applied to every delay (0-1)")
+    args = parser.parse_args()
+
+    fake = FakeOllama(args.host, args.port, args.tokens_per_sec,
+                      args.first_token_ms, args.tokens, args.jitter)
+    web.run_app(fake.make_app(), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
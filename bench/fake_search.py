@@ -0,0 +1,52 @@
+"""
+Stub web search backend for benchmarks.
+
+Replaces the DuckDuckGo tool used by backend.perform_search with a
+deterministic stand-in that sleeps for a configurable latency and returns
+canned structured results, so search-triggering prompts can be benchmarked
+offline.
+"""
+
+import time
+from typing import Dict, List
+
+FACTS = [
+    "officials confirmed the schedule and published figures for the coming quarter.",
+    "analysts compared it with last year's numbers and noted a steady increase.",
+    "a community FAQ lists prices, opening hours and known outages by region.",
+    "reviewers ranked the top options and recommended two budget alternatives.",
+    "the announcement includes release dates, supported versions and requirements.",
+    "local reporters covered the event live with photos and a short timeline.",
+]
+
+class FakeSearchTool:
+    """Drop-in for the DuckDuckGo search tool exposing the same run() method."""
+
+    name = "Search"
+
+    def __init__(self, latency_ms: float = 300.0, results: int = 5):
+        self.latency_ms = latency_ms
+        self.results = results
+        self.calls = 0
+
+    def run(self, query: str) -> List[Dict[str, str]]:
+        """Return results shaped like DuckDuckGoSearchResults(output_format="list")."""
+        self.calls += 1
+        time.sleep(self.latency_ms / 1000)
+        # Variants of one question share URLs, so dedup and ranking get exercised
+        return [
+            {
+                "snippet": f"{query}: {FACTS[i % len(FACTS)]}",
+                "title": f"Example source {i + 1}",
+                "link": f"https://example{i + 1}.com/article"
+            }
+            for i in range(self.results)
+        ]
+
+def install(latency_ms: float = 300.0, results: int = 5) -> FakeSearchTool:
+    """Install a FakeSearchTool as the backend search tool and return it."""
+    import backend
+
+    tool = FakeSearchTool(latency_ms, results)
+    backend.set_search_tool(tool)
+    return tool
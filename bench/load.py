@@ -0,0 +1,233 @@
+"""
+Load driver: N concurrent chat sessions against a fake Ollama server.
+
+Each session sends several turns through the real pipeline and records
+time-to-first-token, per-turn tokens/sec and end-to-end latency. In
+"direct" mode sessions call run_chat_stream and the database module from
+worker threads (like concurrent Streamlit sessions) and every database
+call is timed to expose contention on the shared SQLite connection. In
+"api" mode sessions go through api.py over HTTP/SSE.
+
+    python -m bench.load --sessions 20 --turns 3 --tokens-per-sec 200
+    python -m bench.load --mode api --sessions 50 --output results/api.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from bench.common import summarize, use_temp_database, write_results
+from bench.fake_ollama import FakeOllama
+from bench.micro import PROMPTS
+
+MODEL = "qwen2.5:0.5b"
+
+class Recorder:
+    """Thread-safe collector for per-turn and per-DB-call measurements."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ttft: List[float] = []
+        self.turn_latency: List[float] = []
+        self.tokens_per_sec: List[float] = []
+        self.tokens = 0
+        self.turns = 0
+        self.errors: List[str] = []
+        self.db: Dict[str, List[float]] = {}
+
+    def turn(self, ttft, latency, tokens, stream_time):
+        with self.lock:
+            self.turns += 1
+            self.tokens += tokens
+            self.turn_latency.append(latency)
+            if ttft is not None:
+                self.ttft.append(ttft)
+            if tokens > 1 and stream_time > 0:
+                self.tokens_per_sec.append((tokens - 1) / stream_time)
+
+    def error(self, message: str):
+        with self.lock:
+            self.errors.append(message)
+
+    def timed_db(self, name: str, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        except Exception as e:
+            self.error(f"{name}: {e}")
+        finally:
+            with self.lock:
+                self.db.setdefault(name, []).append(time.perf_counter() - start)
+
+    def report(self, wall: float) -> Dict:
+        return {
+            "turns": self.turns,
+            "tokens": self.tokens,
+            "wall_s": wall,
+            "throughput_tokens_per_s": self.tokens / wall if wall else None,
+            "ttft_s": summarize(self.ttft),
+            "turn_latency_s": summarize(self.turn_latency),
+            "tokens_per_sec_per_turn": summarize(self.tokens_per_sec),
+            "db_call_s": {name: summarize(values) for name, values in self.db.items()},
+            "errors": len(self.errors),
+            "error_samples": self.errors[:5]
+        }
+
+# -------------------- DIRECT MODE --------------------
+
+def _direct_session(index: int, turns: int, recorder: Recorder, auto_search: bool):
+    import database
+    from backend import run_chat_stream, build_messages
+
+    chat_id = str(uuid.uuid4())
+    history = []
+    for turn in range(turns):
+        prompt = PROMPTS[(index + turn) % len(PROMPTS)]
+        history.append({"role": "user", "content": prompt})
+        recorder.timed_db("save_chat_message", database.save_chat_message, chat_id, "user", prompt, False)
+
+        started = time.perf_counter()
+        first = None
+        tokens = 0
+        reply = ""
+        search_used = False
+        try:
+            for chunk, metadata, search_flag in run_chat_stream(build_messages(history), chat_id, MODEL,
+                                                                   enable_auto_search=auto_search):
+                search_used = search_flag
+                if chunk.content:
+                    if first is None:
+                        first = time.perf_counter()
+                    tokens += 1
+                    reply += chunk.content
+        except Exception as e:
+            recorder.error(f"stream: {e}")
+        ended = time.perf_counter()
+        recorder.turn(first - started if first else None, ended - started, tokens,
+                      ended - first if first else 0)
+
+        history.append({"role": "assistant", "content": reply})
+        recorder.timed_db("save_chat_message", database.save_chat_message, chat_id, "assistant", reply, search_used)
+        recorder.timed_db("save_chat_metadata", database.save_chat_metadata, chat_id, prompt[:50], MODEL)
+        recorder.timed_db("get_chat_messages", database.get_chat_messages, chat_id)
+        recorder.timed_db("get_all_chats", database.get_all_chats)
+
+def run_direct(sessions: int, turns: int, recorder: Recorder, auto_search: bool = True):
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        futures = [pool.submit(_direct_session, i, turns, recorder, auto_search) for i in range(sessions)]
+        for future in futures:
+            future.result()
+
+# -------------------- API MODE --------------------
+
+async def _api_session(client, base: str, index: int, turns: int, recorder: Recorder,
+                       auto_search: bool):
+    async with client.post(f"{base}/chats", json={"model": MODEL}) as resp:
+        chat_id = (await resp.json())["chat_id"]
+
+    for turn in range(turns):
+        prompt = PROMPTS[(index + turn) % len(PROMPTS)]
+        started = time.perf_counter()
+        first = None
+        tokens = 0
+        event = None
+        async with client.post(f"{base}/chats/{chat_id}/messages", json={"content": prompt, "enable_auto_search": auto_search}) as resp:
+            async for raw in resp.content:
+                line = raw.decode("utf-8").rstrip("\n")
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: ") and event == "token":
+                    if first is None:
+                        first = time.perf_counter()
+                    tokens += 1
+                elif line.startswith("data: ") and event == "error":
+                    recorder.error(json.loads(line[6:])["message"])
+        ended = time.perf_counter()
+        recorder.turn(first - started if first else None, ended - started, tokens,
+                      ended - first if first else 0)
+
+async def _run_api(sessions: int, turns: int, recorder: Recorder, auto_search: bool):
+    from aiohttp import ClientSession, ClientTimeout, TCPConnector, web
+    import api
+
+    runner = web.AppRunner(api.create_app(max_streams=sessions))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    try:
+        async with ClientSession(connector=TCPConnector(limit=0), timeout=ClientTimeout(total=None)) as client:
+            await asyncio.gather(*(_api_session(client, base, i, turns, recorder, auto_search) for i in range(sessions)))
+    finally:
+        await runner.cleanup()
+
+def run_api(sessions: int, turns: int, recorder: Recorder, auto_search: bool = True):
+    asyncio.run(_run_api(sessions, turns, recorder, auto_search))
+
+# -------------------- MAIN --------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent chat session load test")
+    parser.add_argument("--mode", choices=["direct", "api"], default="direct")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--tokens", type=int, default=64, help="Tokens per fake reply")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--first-token-ms", type=float, default=50.0)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--search-latency-ms", type=float, default=300.0)
+    parser.add_argument("--no-search", action="store_true", help="Disable auto search entirely")
+    parser.add_argument("--output", help="Result JSON path (default: bench/results/)")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    use_temp_database()
+    fake = FakeOllama(tokens_per_sec=args.tokens_per_sec, first_token_ms=args.first_token_ms,
+                      tokens=args.tokens, jitter=args.jitter, seed=0).start()
+    os.environ["OLLAMA_HOST"] = fake.url
+
+    import backend
+    import tracing
+    from bench import fake_search
+
+    search = fake_search.install(args.search_latency_ms)
+
+    # Pay lazy imports and model client setup before timing steady-state load
+    backend.build_messages([])
+    backend.get_model(MODEL, streaming=True)
+    tracing.reset()
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    try:
+        (run_api if args.mode == "api" else run_direct)(args.sessions, args.turns, recorder,
+                                                         not args.no_search)
+    finally:
+        wall = time.perf_counter() - started
+        fake.stop()
+
+    results = recorder.report(wall)
+    results["config"] = vars(args)
+    results["fake_ollama"] = {"requests": fake.requests, "max_concurrent": fake.max_active}
+    results["searches"] = search.calls
+    results["stages_ms"] = tracing.stage_summary()
+
+    ttft, latency = results["ttft_s"], results["turn_latency_s"]
+    print(f"{results['turns']} turns, {results['tokens']} tokens in {wall:.2f}s "
+          f"({results['throughput_tokens_per_s']:.1f} tok/s), {results['errors']} errors")
+    if ttft["count"]:
+        print(f"TTFT      p50={ttft['p50'] * 1000:.1f}ms p95={ttft['p95'] * 1000:.1f}ms p99={ttft['p99'] * 1000:.1f}ms")
+    if latency["count"]:
+        print(f"Turn      p50={latency['p50'] * 1000:.1f}ms p95={latency['p95'] * 1000:.1f}ms p99={latency['p99'] * 1000:.1f}ms")
+    for name, stats in results["db_call_s"].items():
+        print(f"DB {name:<20} p50={stats['p50'] * 1000:.2f}ms p99={stats['p99'] * 1000:.2f}ms max={stats['max'] * 1000:.2f}ms")
+    print(f"Results written to {write_results('load-' + args.mode, results, output)}")
+
+if __name__ == "__main__":
+    main()
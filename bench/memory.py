@@ -0,0 +1,153 @@
+"""
+Session memory benchmark.
+
+Simulates many open browser sessions, each on a long chat, and measures
+the Python heap they hold (tracemalloc) in two layouts:
+
+- "full": every session keeps its whole history as a list of dicts, as
+  st.session_state.history did
+- "store": sessions go through session_store.SessionStore with a window
+  and a memory budget
+
+then replays random activity against the store and times rehydrating
+evicted sessions.
+
+    python -m bench.memory --sessions 500 --messages 200
+    python -m bench.memory --sessions 500 --budget-mb 8 --window 50
+"""
+
+import argparse
+import gc
+import os
+import random
+import time
+import tracemalloc
+import uuid
+from typing import Callable, Dict, List
+
+from bench.common import summarize, use_temp_database, write_results
+from bench.micro import PROMPTS
+
+def populate(chats: int, messages: int, message_chars: int) -> List[str]:
+    """Write chats with long histories straight into chat_messages."""
+    from database import get_db_connection
+
+    conn = get_db_connection()
+    chat_ids = [str(uuid.uuid4()) for _ in range(chats)]
+    for chat_id in chat_ids:
+        rows = []
+        for i in range(messages):
+            base = PROMPTS[i % len(PROMPTS)]
+            content = (base + " ") * (message_chars // len(base) + 1)
+            rows.append((chat_id, "user" if i % 2 == 0 else "assistant", content[:message_chars], i % 7 == 0))
+        conn.executemany(
+            "INSERT INTO chat_messages (chat_id, role, content, search_used) VALUES (?, ?, ?, ?)", rows
+        )
+        conn.execute(
+            "INSERT INTO chat_history (chat_id, title, model, message_count) VALUES (?, 'Benchmark chat', 'qwen2.5:0.5b', ?)",
+            (chat_id, messages // 2)
+        )
+    conn.commit()
+    return chat_ids
+
+def measure_heap(build: Callable[[], object]) -> Dict:
+    """Heap bytes held by the object build() returns, plus the build time."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    held = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return {"bytes": current, "peak_bytes": peak, "build_s": elapsed}
+
+def bench_full(chat_ids: List[str]) -> Dict:
+    from database import get_chat_messages
+
+    def build():
+        return {
+            chat_id: [
+                {"role": m["role"], "content": m["content"], "search_used": m["search_used"], "stopped": m["stopped"]}
+                for m in get_chat_messages(chat_id)
+            ]
+            for chat_id in chat_ids
+        }
+    return measure_heap(build)
+
+def bench_store(chat_ids: List[str], budget_bytes: int, window: int, steps: int, seed: int) -> Dict:
+    from database import save_chat_message
+    from session_store import SessionStore
+
+    store = SessionStore(budget_bytes=budget_bytes, window=window)
+
+    def build():
+        for chat_id in chat_ids:
+            store.get(chat_id).open(chat_id)
+        return store
+    result = measure_heap(build)
+    result["after_open"] = store.memory_usage()
+
+    # Random activity: mostly reads, some new messages, skewed towards a
+    # minority of active sessions so idle ones get evicted
+    rng = random.Random(seed)
+    active = chat_ids[:max(1, len(chat_ids) // 10)]
+    rehydrate, touch = [], []
+    for _ in range(steps):
+        chat_id = rng.choice(active) if rng.random() < 0.8 else rng.choice(chat_ids)
+        session = store.get(chat_id)
+        resident = session.resident
+        start = time.perf_counter()
+        session.messages
+        (touch if resident else rehydrate).append(time.perf_counter() - start)
+        if rng.random() < 0.2:
+            # As in the app: saved first, then added to the window
+            content = PROMPTS[rng.randrange(len(PROMPTS))]
+            save_chat_message(chat_id, "user", content, False)
+            session.append("user", content)
+    result["after_activity"] = store.memory_usage()
+    result["access_resident"] = summarize(touch)
+    result["access_rehydrate"] = summarize(rehydrate)
+    return result
+
+def _mb(value: int) -> str:
+    return f"{value / 1024 / 1024:8.1f} MB"
+
+def main():
+    parser = argparse.ArgumentParser(description="Session memory benchmark")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=200, help="Messages per chat")
+    parser.add_argument("--message-chars", type=int, default=600)
+    parser.add_argument("--window", type=int, default=50, help="Messages kept in memory per session")
+    parser.add_argument("--budget-mb", type=float, default=8.0, help="Memory budget for all sessions")
+    parser.add_argument("--steps", type=int, default=5000, help="Random session accesses after opening")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Result JSON path (default: bench/results/)")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    use_temp_database()
+    chat_ids = populate(args.sessions, args.messages, args.message_chars)
+    budget_bytes = int(args.budget_mb * 1024 * 1024)
+    results = {
+        "config": vars(args),
+        "full": bench_full(chat_ids),
+        "store": bench_store(chat_ids, budget_bytes, args.window, args.steps, args.seed)
+    }
+
+    full, store = results["full"], results["store"]
+    print(f"{args.sessions} sessions x {args.messages} messages ({args.message_chars} chars)")
+    print(f"  full history in memory   {_mb(full['bytes'])}")
+    print(f"  session store            {_mb(store['bytes'])}  "
+          f"(accounted {_mb(store['after_activity']['bytes'])}, budget {_mb(budget_bytes)})")
+    print(f"  resident sessions        {store['after_activity']['resident_sessions']}/{args.sessions}  "
+          f"evictions={store['after_activity']['evictions']}  rehydrations={store['after_activity']['rehydrations']}")
+    for name in ("access_resident", "access_rehydrate"):
+        stats = store[name]
+        if stats["count"]:
+            print(f"  {name:<24} p50={stats['p50'] * 1e6:9.1f}us  p95={stats['p95'] * 1e6:9.1f}us  n={stats['count']}")
+    print(f"Results written to {write_results('memory', results, output)}")
+
+if __name__ == "__main__":
+    main()
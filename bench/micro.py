@@ -0,0 +1,164 @@
+"""
+Micro-benchmarks for hot paths that do not involve the model.
+
+Covers search keyword matching, search query extraction, search result
+post-processing, message building, database reads/writes and file text
+extraction. Runs against a throwaway database so the real chat_memory.db
+is never touched.
+
+    python -m bench.micro --repeat 2000
+    python -m bench.micro --only db --output results/db.json
+"""
+
+import argparse
+import io
+import os
+import uuid
+
+from bench.common import time_call, use_temp_database, write_results
+
+PROMPTS = [
+    "What is the latest news about the election?",
+    "Explain recursion with a simple example",
+    "Write a haiku about autumn leaves",
+    "How many people live in Tokyo?",
+    "Refactor this function to be more readable",
+    "Compare Python and Rust for systems programming",
+    "Tell me a joke",
+    "What's the weather forecast for tomorrow in Paris?",
+    "Summarise the attached document in three bullet points",
+    "Translate 'good morning' into Spanish",
+]
+
+def bench_keywords(repeat: int) -> dict:
+    from backend import should_search, extract_search_query
+
+    hits = sum(should_search(p) for p in PROMPTS)
+    return {
+        "should_search": time_call(lambda: [should_search(p) for p in PROMPTS], repeat=repeat),
+        "prompts_triggering_search": hits,
+        "extract_search_query": time_call(lambda: [extract_search_query(p) for p in PROMPTS], repeat=repeat),
+        "prompts_per_call": len(PROMPTS)
+    }
+
+def bench_search(repeat: int) -> dict:
+    import web_search
+    from bench.fake_search import FakeSearchTool
+
+    tool = FakeSearchTool(latency_ms=0, results=10)
+    question = PROMPTS[0]
+    raw = [tool.run(v) for v in web_search.generate_query_variants(question)]
+
+    def process():
+        snippets = []
+        for output in raw:
+            snippets.extend(web_search.parse_results(output))
+        return web_search.pack(web_search.rank(web_search.dedupe(snippets), question))
+
+    packed = process()
+    return {
+        "generate_query_variants": time_call(web_search.generate_query_variants, question, repeat=repeat),
+        "parse_dedupe_rank_pack": time_call(process, repeat=repeat),
+        "raw_chars": sum(len(str(r)) for r in raw),
+        "packed_tokens": web_search.estimate_tokens(packed)
+    }
+
+def bench_messages(repeat: int) -> dict:
+    from backend import build_messages
+    from database import get_chat_documents
+    from file_utils import NamedBytesIO, store_upload
+
+    history = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": PROMPTS[i % len(PROMPTS)] * 5}
+        for i in range(50)
+    ]
+    chat_id = str(uuid.uuid4())
+    store_upload(chat_id, NamedBytesIO(b"x" * 10000, "notes.txt"))
+    documents = get_chat_documents(chat_id)
+    return {
+        "build_messages_50": time_call(build_messages, history, documents, repeat=repeat)
+    }
+
+def bench_db(repeat: int, chats: int = 200, messages_per_chat: int = 50) -> dict:
+    import database
+
+    chat_ids = [str(uuid.uuid4()) for _ in range(chats)]
+    for chat_id in chat_ids:
+        database.save_chat_metadata(chat_id, "Benchmark chat", "qwen2.5:0.5b")
+    target = chat_ids[0]
+    for i in range(messages_per_chat):
+        database.save_chat_message(target, "user" if i % 2 == 0 else "assistant", PROMPTS[i % len(PROMPTS)])
+
+    write_repeat = max(1, repeat // 10)
+    return {
+        "save_chat_message": time_call(database.save_chat_message, target, "user", "hello", repeat=write_repeat),
+        "save_chat_metadata": time_call(database.save_chat_metadata, target, "Benchmark chat", "qwen2.5:0.5b", repeat=write_repeat),
+        "get_chat_messages": time_call(database.get_chat_messages, target, repeat=repeat),
+        "get_all_chats": time_call(database.get_all_chats, repeat=repeat),
+        "get_chat_metadata": time_call(database.get_chat_metadata, target, repeat=repeat),
+        "get_database_stats": time_call(database.get_database_stats, repeat=max(1, repeat // 10)),
+        "chats": chats,
+        "messages_in_target_chat": messages_per_chat + write_repeat
+    }
+
+def _docx_bytes(paragraphs: int) -> bytes:
+    from docx import Document
+
+    doc = Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(f"Paragraph {i}: " + PROMPTS[i % len(PROMPTS)])
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+def bench_extraction(repeat: int) -> dict:
+    from file_utils import NamedBytesIO, extract_file_content, store_upload
+
+    text = ("\n".join(PROMPTS) * 1000).encode("utf-8")
+    docx = _docx_bytes(500)
+    extract_repeat = max(1, repeat // 100)
+    # The first upload extracts and stores; every later one is a hash lookup
+    store_upload(str(uuid.uuid4()), NamedBytesIO(docx, "bench.docx"))
+    return {
+        "txt_bytes": len(text),
+        "txt": time_call(lambda: extract_file_content(NamedBytesIO(text, "bench.txt")), repeat=extract_repeat),
+        "docx_bytes": len(docx),
+        "docx": time_call(lambda: extract_file_content(NamedBytesIO(docx, "bench.docx")), repeat=extract_repeat),
+        "docx_reupload": time_call(lambda: store_upload(str(uuid.uuid4()), NamedBytesIO(docx, "bench.docx")),
+                                   repeat=extract_repeat)
+    }
+
+SUITES = {
+    "keywords": bench_keywords,
+    "search": bench_search,
+    "messages": bench_messages,
+    "db": bench_db,
+    "extraction": bench_extraction,
+}
+
+def _print(results: dict):
+    for suite, metrics in results.items():
+        print(f"[{suite}]")
+        for name, value in metrics.items():
+            if isinstance(value, dict) and value.get("count"):
+                print(f"  {name:<28} p50={value['p50'] * 1e6:10.1f}us  p95={value['p95'] * 1e6:10.1f}us  n={value['count']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Chatbot micro-benchmarks")
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--only", choices=sorted(SUITES), action="append",
+                        help="Run only the given suite (repeatable)")
+    parser.add_argument("--output", help="Result JSON path (default: bench/results/)")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    use_temp_database()
+    results = {}
+    for name in args.only or SUITES:
+        results[name] = SUITES[name](args.repeat)
+
+    _print(results)
+    print(f"Results written to {write_results('micro', results, output)}")
+
+if __name__ == "__main__":
+    main()
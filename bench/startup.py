@@ -0,0 +1,132 @@
+"""
+Cold-start benchmark based on `python -X importtime`.
+
+Imports each app module in a fresh interpreter several times, reports the
+median cumulative import time and the heaviest dependencies pulled in,
+and checks that heavy libraries (LangChain, LangGraph, Ollama, PDF/DOCX
+readers) are not loaded eagerly. For modules that used to import those
+libraries at the top, the same run also times the old eager import set,
+so the result shows the cold-start cut (`import` vs `eager_import`,
+comparable with bench.compare).
+
+    python -m bench.startup
+    python -m bench.startup --check --max-ms 150   # exit 1 on regression
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from bench.common import summarize, use_temp_database, write_results
+
+MODULES = ["database", "file_utils", "tracing", "backend", "api", "batch"]
+
+# Libraries that must only load on first use, never on import of the app modules
+LAZY_MODULES = [
+    "langgraph", "langchain_core", "langchain_ollama", "langchain_community",
+    "ollama", "duckduckgo_search", "ddgs", "pypdf", "docx"
+]
+
+# What importing each module used to pull in before heavy imports were deferred
+EAGER_IMPORTS = {
+    "backend": [
+        "langgraph.graph", "langgraph.graph.message", "langchain_core.messages",
+        "langchain_ollama", "langgraph.checkpoint.sqlite", "langchain_community.tools"
+    ],
+    "file_utils": ["pypdf", "docx"]
+}
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _importtime(module: str) -> List[Tuple[int, int, str]]:
+    """Import a module in a fresh interpreter; return (self_us, cumulative_us, name) rows."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True, env=os.environ.copy()
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+def _timed_import(modules: List[str]) -> float:
+    """Wall time (seconds) of importing modules, in order, in a fresh interpreter."""
+    code = f"import time; start = time.perf_counter(); import {', '.join(modules)}; print(time.perf_counter() - start)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT,
+                            capture_output=True, text=True, env=os.environ.copy())
+    if result.returncode != 0:
+        raise RuntimeError(f"import {', '.join(modules)} failed:\n{result.stderr[-2000:]}")
+    return float(result.stdout.strip())
+
+def measure(module: str, runs: int) -> Dict:
+    """Median cold import time of a module plus its heaviest imports."""
+    totals = []
+    rows = []
+    lazy, eager = [], []
+    for _ in range(runs):
+        rows = _importtime(module)
+        totals.append(next(c for s, c, n in reversed(rows) if n.strip() == module) / 1000)
+        lazy.append(_timed_import([module]))
+        if module in EAGER_IMPORTS:
+            eager.append(_timed_import(EAGER_IMPORTS[module] + [module]))
+    loaded = {n.strip() for s, c, n in rows}
+    top_level = [(c, n.strip()) for s, c, n in rows if not n.startswith("  ")]
+    top_level.sort(reverse=True)
+    result = {
+        "median_ms": statistics.median(totals),
+        "min_ms": min(totals),
+        "runs": runs,
+        "heaviest": [{"module": n, "ms": c / 1000} for c, n in top_level[1:11]],
+        "eager_heavy_imports": sorted(
+            m for m in LAZY_MODULES if any(l == m or l.startswith(m + ".") for l in loaded)
+        ),
+        "import": summarize(lazy)
+    }
+    if eager:
+        result["eager_import"] = summarize(eager)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--check", action="store_true",
+                        help="Exit non-zero if a heavy library loads eagerly or a budget is exceeded")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Budget for importing backend (median ms) when --check is set")
+    parser.add_argument("--output", help="Result JSON path (default: bench/results/)")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    use_temp_database()
+    results = {module: measure(module, args.runs) for module in args.modules}
+
+    failures = []
+    for module, info in results.items():
+        eager = ", ".join(info["eager_heavy_imports"]) or "-"
+        line = f"{module:<12} median={info['median_ms']:8.1f}ms  min={info['min_ms']:8.1f}ms  eager heavy imports: {eager}"
+        if "eager_import" in info:
+            line += f"  (eager import set p50={info['eager_import']['p50'] * 1000:.1f}ms, "
+            line += f"lazy p50={info['import']['p50'] * 1000:.1f}ms)"
+        print(line)
+        if info["eager_heavy_imports"]:
+            failures.append(f"{module} eagerly imports {eager}")
+    if args.max_ms is not None and "backend" in results and results["backend"]["median_ms"] > args.max_ms:
+        failures.append(f"backend import took {results['backend']['median_ms']:.1f}ms (budget {args.max_ms}ms)")
+
+    print(f"Results written to {write_results('startup', results, output)}")
+    if args.check and failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Cooperative cancellation for in-flight generations.
+
+A CancellationToken is passed to run_chat_stream. Cancelling it stops the
+token loop at the next chunk and, through CancellableTransport, shuts down
+the HTTP connection to Ollama so a blocked read returns immediately and
+the server stops generating.
+
+The GenerationMonitor watchdog cancels generations whose consumer has gone
+away: either an is_alive() check fails (e.g. the browser session closed)
+or the stream has sat suspended at a yield, unread, for too long.
+"""
+
+import socket
+import threading
+import time
+from typing import Callable, List, Optional
+
+ABANDON_TIMEOUT_S = 30.0
+MONITOR_INTERVAL_S = 2.0
+
+# -------------------- TOKEN --------------------
+
+class CancellationToken:
+    """
+    Thread-safe cancel flag with callbacks run once on cancellation.
+
+    Args:
+        is_alive: Optional check polled by the monitor; returning False
+            means the consumer is gone and the generation is cancelled
+    """
+
+    def __init__(self, is_alive: Optional[Callable[[], bool]] = None):
+        self.is_alive = is_alive
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self.reason: Optional[str] = None
+        self.suspended_since: Optional[float] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "stopped"):
+        """Cancel the generation; safe to call repeatedly and from any thread."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def add_callback(self, callback: Callable[[], None]):
+        """Run callback on cancellation (immediately if already cancelled)."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def suspend(self):
+        """Mark the stream as waiting for its consumer (at a yield)."""
+        self.suspended_since = time.monotonic()
+
+    def resume(self):
+        """Mark the consumer as having pulled the next chunk."""
+        self.suspended_since = None
+
+# -------------------- HTTP TRANSPORT --------------------
+
+def make_cancellable_transport(token: CancellationToken):
+    """
+    Build an httpx transport whose sockets are shut down when token is cancelled.
+
+    Closing an httpx client does not interrupt a read blocked in another
+    thread; shutting the socket down does, and also tells Ollama the client
+    is gone. Sockets are recorded as they connect, through httpcore's
+    network_backend hook, so a request still waiting for its first byte
+    (prefill) can be aborted too.
+    """
+    import httpcore
+    import httpx
+
+    class TrackingBackend(httpcore.SyncBackend):
+        def __init__(self):
+            self.sockets = []
+
+        def connect_tcp(self, *args, **kwargs):
+            stream = super().connect_tcp(*args, **kwargs)
+            sock = stream.get_extra_info("socket")
+            if sock is not None:
+                self.sockets.append(sock)
+                if token.cancelled:
+                    _shutdown(sock)
+            return stream
+
+    def raise_as_httpx(error: Exception):
+        # httpx has an exception of the same name for every httpcore one
+        raise getattr(httpx, type(error).__name__, httpx.TransportError)(str(error)) from error
+
+    class ResponseStream(httpx.SyncByteStream):
+        def __init__(self, response: httpcore.Response):
+            self.response = response
+
+        def __iter__(self):
+            try:
+                yield from self.response.iter_stream()
+            except httpcore.TransportError as e:
+                raise_as_httpx(e)
+
+        def close(self):
+            self.response.close()
+
+    class CancellableTransport(httpx.BaseTransport):
+        def __init__(self):
+            self.backend = TrackingBackend()
+            self.pool = httpcore.ConnectionPool(ssl_context=httpx.create_ssl_context(),
+                                                network_backend=self.backend)
+
+        def handle_request(self, request: httpx.Request) -> httpx.Response:
+            url = request.url
+            try:
+                response = self.pool.handle_request(httpcore.Request(
+                    method=request.method,
+                    url=httpcore.URL(scheme=url.raw_scheme, host=url.raw_host, port=url.port, target=url.raw_path),
+                    headers=request.headers.raw,
+                    content=request.stream,
+                    extensions=request.extensions
+                ))
+            except httpcore.TransportError as e:
+                raise_as_httpx(e)
+            return httpx.Response(status_code=response.status, headers=response.headers,
+                                  stream=ResponseStream(response), extensions=response.extensions)
+
+        def close(self):
+            self.pool.close()
+
+        def abort(self):
+            for sock in self.backend.sockets:
+                _shutdown(sock)
+
+    transport = CancellableTransport()
+    token.add_callback(transport.abort)
+    return transport
+
+def _shutdown(sock: socket.socket):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+# -------------------- ABANDONED GENERATIONS --------------------
+
+class GenerationMonitor:
+    """Background watchdog cancelling generations whose consumer is gone."""
+
+    def __init__(self, abandon_timeout_s: float = ABANDON_TIMEOUT_S,
+                 interval_s: float = MONITOR_INTERVAL_S):
+        self.abandon_timeout_s = abandon_timeout_s
+        self.interval_s = interval_s
+        self._lock = threading.Lock()
+        self._active = {}
+        self._thread = None
+
+    def register(self, token: CancellationToken):
+        """Watch a generation until unregister() or cancellation."""
+        with self._lock:
+            self._active[id(token)] = token
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="generation-monitor", daemon=True)
+                self._thread.start()
+
+    def unregister(self, token: CancellationToken):
+        with self._lock:
+            self._active.pop(id(token), None)
+
+    def active_count(self) -> int:
+        with self._lock:
+            return len(self._active)
+
+    def check(self):
+        """Cancel abandoned generations once (called periodically by the watchdog)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens = list(self._active.values())
+        for token in tokens:
+            if token.cancelled:
+                self.unregister(token)
+                continue
+            suspended = token.suspended_since
+            if suspended is not None and now - suspended > self.abandon_timeout_s:
+                token.cancel("abandoned")
+            elif token.is_alive is not None:
+                try:
+                    alive = token.is_alive()
+                except Exception:
+                    alive = True
+                if not alive:
+                    token.cancel("abandoned")
+            if token.cancelled:
+                self.unregister(token)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval_s)
+            self.check()
+
+monitor = GenerationMonitor()
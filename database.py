@@ -1,15 +1,79 @@
+import os
 import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from functools import wraps
 from typing import List, Dict, Optional
 from datetime import datetime
+from tracing import traced
 
 # -------------------- DATABASE SETUP --------------------
 
-DB_FILE = "chat_memory.db"
-conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+DB_FILE = os.environ.get("CHATBOT_DB", "chat_memory.db")
+
+# The connection is opened (and tables created) on first use rather than at
+# import, so importing this module has no side effects.
+_conn = None
+_conn_lock = threading.Lock()
+
+def get_db_connection() -> sqlite3.Connection:
+    """Get the shared database connection, opening and initializing it on first use."""
+    global _conn
+    if _conn is None:
+        with _conn_lock:
+            if _conn is None:
+                conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+                init_database(conn)
+                _conn = conn
+    return _conn
+
+# The connection is shared by every thread (Streamlit sessions, API and
+# batch workers), and sqlite3 connections are not safe for concurrent use:
+# each function holds _db_lock for its queries and commit.
+_db_lock = threading.RLock()
+_transaction_depth = 0
+
+def _serialized(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with _db_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+def _commit(conn: sqlite3.Connection):
+    # Inside transaction() the commit happens once, when the block ends
+    if _transaction_depth == 0:
+        conn.commit()
+
+@contextmanager
+def transaction():
+    """
+    Run several database calls as one transaction.
+
+    The calls inside the block are committed together when it ends, or
+    rolled back if it raises; other threads wait until then.
+    """
+    global _transaction_depth
+    with _db_lock:
+        conn = get_db_connection()
+        _transaction_depth += 1
+        try:
+            yield conn
+        except BaseException:
+            _transaction_depth -= 1
+            if _transaction_depth == 0:
+                conn.rollback()
+            raise
+        _transaction_depth -= 1
+        if _transaction_depth == 0:
+            conn.commit()
 
 # Create tables
-def init_database():
+def init_database(conn: Optional[sqlite3.Connection] = None):
     """Initialize database tables."""
+    if conn is None:
+        conn = get_db_connection()
     cursor = conn.cursor()
     
     # Create table for chat history metadata
@@ -33,21 +97,56 @@ def init_database():
             role TEXT,
             content TEXT,
             search_used BOOLEAN DEFAULT 0,
+            stopped BOOLEAN DEFAULT 0,
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (chat_id) REFERENCES chat_history(chat_id) ON DELETE CASCADE
         )
     """)
 
+    # Uploaded documents, stored once per distinct file content. The
+    # extracted text is zlib-compressed and only read when a prompt needs it.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            content_hash TEXT PRIMARY KEY,
+            file_name TEXT,
+            size INTEGER,
+            char_count INTEGER,
+            text BLOB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Documents attached to each chat (many-to-many)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_documents (
+            chat_id TEXT,
+            content_hash TEXT,
+            file_name TEXT,
+            attached_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (chat_id, content_hash),
+            FOREIGN KEY (content_hash) REFERENCES documents(content_hash) ON DELETE CASCADE
+        )
+    """)
+
+    # Add columns introduced after the original schema to existing databases
+    cursor.execute("PRAGMA table_info(chat_messages)")
+    columns = {row[1] for row in cursor.fetchall()}
+    if "stopped" not in columns:
+        cursor.execute("ALTER TABLE chat_messages ADD COLUMN stopped BOOLEAN DEFAULT 0")
+
+    # Loading a chat (or the recent window of one) reads its messages in id order
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_chat ON chat_messages(chat_id, id)")
+
     conn.commit()
     cursor.close()
 
-# Initialize database on import
-init_database()
-
 # -------------------- DATABASE FUNCTIONS --------------------
 
+@traced("db.save_chat_metadata")
+@_serialized
 def save_chat_metadata(chat_id: str, title: str, model: str, file_name: Optional[str] = None):
     """Save or update chat metadata."""
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("""
         INSERT INTO chat_history (chat_id, title, model, file_name, message_count, last_updated)
@@ -59,24 +158,44 @@ def save_chat_metadata(chat_id: str, title: str, model: str, file_name: Optional
             message_count = message_count + 1,
             last_updated = CURRENT_TIMESTAMP
     """, (chat_id, title, model, file_name))
-    conn.commit()
+    _commit(conn)
     cursor.close()
 
-def save_chat_message(chat_id: str, role: str, content: str, search_used: bool = False):
-    """Save individual chat message."""
+@traced("db.create_chat")
+@_serialized
+def create_chat(chat_id: str, title: str, model: str):
+    """Create an empty chat entry if it does not already exist."""
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("""
-        INSERT INTO chat_messages (chat_id, role, content, search_used)
-        VALUES (?, ?, ?, ?)
-    """, (chat_id, role, content, search_used))
-    conn.commit()
+        INSERT OR IGNORE INTO chat_history (chat_id, title, model, message_count)
+        VALUES (?, ?, ?, 0)
+    """, (chat_id, title, model))
+    _commit(conn)
+    cursor.close()
+
+@traced("db.save_chat_message")
+@_serialized
+def save_chat_message(chat_id: str, role: str, content: str, search_used: bool = False,
+                      stopped: bool = False):
+    """Save individual chat message; stopped marks a reply cut short by the user."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO chat_messages (chat_id, role, content, search_used, stopped)
+        VALUES (?, ?, ?, ?, ?)
+    """, (chat_id, role, content, search_used, stopped))
+    _commit(conn)
     cursor.close()
 
+@traced("db.get_chat_messages")
+@_serialized
 def get_chat_messages(chat_id: str) -> List[Dict]:
     """Get all messages for a specific chat."""
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("""
-        SELECT role, content, search_used, timestamp
+        SELECT role, content, search_used, timestamp, stopped
         FROM chat_messages
         WHERE chat_id = ?
         ORDER BY timestamp ASC
@@ -89,13 +208,173 @@ def get_chat_messages(chat_id: str) -> List[Dict]:
             "role": row[0],
             "content": row[1],
             "search_used": row[2],
-            "timestamp": row[3]
+            "timestamp": row[3],
+            "stopped": bool(row[4])
+        }
+        for row in rows
+    ]
+
+@traced("db.get_recent_chat_messages")
+@_serialized
+def get_recent_chat_messages(chat_id: str, limit: int) -> Dict:
+    """Get the last `limit` messages of a chat (oldest first) and the chat's total message count."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM chat_messages WHERE chat_id = ?", (chat_id,))
+    total = cursor.fetchone()[0]
+    cursor.execute("""
+        SELECT role, content, search_used, timestamp, stopped
+        FROM chat_messages
+        WHERE chat_id = ?
+        ORDER BY id DESC
+        LIMIT ?
+    """, (chat_id, limit))
+    rows = cursor.fetchall()
+    cursor.close()
+
+    return {
+        "total": total,
+        "messages": [
+            {
+                "role": row[0],
+                "content": row[1],
+                "search_used": row[2],
+                "timestamp": row[3],
+                "stopped": bool(row[4])
+            }
+            for row in reversed(rows)
+        ]
+    }
+
+@traced("db.get_document")
+@_serialized
+def get_document(content_hash: str) -> Optional[Dict]:
+    """Get a stored document's metadata (without text), or None if the content is new."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT content_hash, file_name, size, char_count, created_at
+        FROM documents
+        WHERE content_hash = ?
+    """, (content_hash,))
+    row = cursor.fetchone()
+    cursor.close()
+
+    if row:
+        return {
+            "content_hash": row[0],
+            "file_name": row[1],
+            "size": row[2],
+            "char_count": row[3],
+            "created_at": row[4]
+        }
+    return None
+
+@traced("db.save_document")
+@_serialized
+def save_document(content_hash: str, file_name: str, size: int, text: str):
+    """Store a document's extracted text compressed; no-op if the content is already stored."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT OR IGNORE INTO documents (content_hash, file_name, size, char_count, text)
+        VALUES (?, ?, ?, ?, ?)
+    """, (content_hash, file_name, size, len(text), zlib.compress(text.encode("utf-8"))))
+    _commit(conn)
+    cursor.close()
+
+@traced("db.attach_document")
+@_serialized
+def attach_document(chat_id: str, content_hash: str, file_name: str):
+    """Link a stored document to a chat under the name it was uploaded with."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO chat_documents (chat_id, content_hash, file_name)
+        VALUES (?, ?, ?)
+        ON CONFLICT(chat_id, content_hash) DO UPDATE SET file_name = excluded.file_name
+    """, (chat_id, content_hash, file_name))
+    cursor.execute("""
+        UPDATE chat_history
+        SET file_name = ?, last_updated = CURRENT_TIMESTAMP
+        WHERE chat_id = ?
+    """, (file_name, chat_id))
+    _commit(conn)
+    cursor.close()
+
+@traced("db.detach_document")
+@_serialized
+def detach_document(chat_id: str, content_hash: str):
+    """Remove a document from a chat, deleting it if no other chat uses it."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM chat_documents WHERE chat_id = ? AND content_hash = ?", (chat_id, content_hash))
+    cursor.execute("""
+        SELECT file_name FROM chat_documents
+        WHERE chat_id = ?
+        ORDER BY attached_at DESC, rowid DESC
+        LIMIT 1
+    """, (chat_id,))
+    row = cursor.fetchone()
+    cursor.execute("UPDATE chat_history SET file_name = ? WHERE chat_id = ?", (row[0] if row else None, chat_id))
+    _delete_orphan_documents(cursor)
+    _commit(conn)
+    cursor.close()
+
+@traced("db.get_chat_documents")
+@_serialized
+def get_chat_documents(chat_id: str) -> List[Dict]:
+    """Get the documents attached to a chat (metadata only, without text)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT cd.content_hash, cd.file_name, d.size, d.char_count, cd.attached_at
+        FROM chat_documents cd
+        JOIN documents d ON d.content_hash = cd.content_hash
+        WHERE cd.chat_id = ?
+        ORDER BY cd.attached_at ASC, cd.rowid ASC
+    """, (chat_id,))
+    rows = cursor.fetchall()
+    cursor.close()
+
+    return [
+        {
+            "content_hash": row[0],
+            "file_name": row[1],
+            "size": row[2],
+            "char_count": row[3],
+            "attached_at": row[4]
         }
         for row in rows
     ]
 
+@traced("db.get_document_text")
+@_serialized
+def get_document_text(content_hash: str) -> Optional[str]:
+    """
+    Get a document's extracted text, decompressing it on demand.
+
+    Not cached: documents can be tens of MB, and decompressing is cheap
+    next to prompt prefill, so no text is held between prompts.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT text FROM documents WHERE content_hash = ?", (content_hash,))
+    row = cursor.fetchone()
+    cursor.close()
+    return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+def _delete_orphan_documents(cursor: sqlite3.Cursor):
+    cursor.execute("""
+        DELETE FROM documents
+        WHERE content_hash NOT IN (SELECT content_hash FROM chat_documents)
+    """)
+
+@traced("db.get_all_chats")
+@_serialized
 def get_all_chats() -> List[Dict]:
     """Get all chat history metadata."""
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT chat_id, title, model, file_name, message_count, created_at, last_updated
@@ -118,8 +397,53 @@ def get_all_chats() -> List[Dict]:
         for row in rows
     ]
 
+@traced("db.get_chats_page")
+@_serialized
+def get_chats_page(limit: int = 20, offset: int = 0, search: Optional[str] = None) -> Dict:
+    """Get one page of chat history metadata, optionally filtered by title."""
+    where = ""
+    params = []
+    if search:
+        where = "WHERE title LIKE ?"
+        params.append(f"%{search}%")
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM chat_history {where}", params)
+    total = cursor.fetchone()[0]
+    cursor.execute(f"""
+        SELECT chat_id, title, model, file_name, message_count, created_at, last_updated
+        FROM chat_history
+        {where}
+        ORDER BY last_updated DESC
+        LIMIT ? OFFSET ?
+    """, params + [limit, offset])
+    rows = cursor.fetchall()
+    cursor.close()
+
+    return {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "chats": [
+            {
+                "chat_id": row[0],
+                "title": row[1],
+                "model": row[2],
+                "file_name": row[3],
+                "message_count": row[4],
+                "created_at": row[5],
+                "last_updated": row[6]
+            }
+            for row in rows
+        ]
+    }
+
+@traced("db.get_chat_metadata")
+@_serialized
 def get_chat_metadata(chat_id: str) -> Optional[Dict]:
     """Get metadata for a specific chat."""
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT chat_id, title, model, file_name, message_count, created_at, last_updated
@@ -141,37 +465,55 @@ def get_chat_metadata(chat_id: str) -> Optional[Dict]:
         }
     return None
 
+@traced("db.delete_chat")
+@_serialized
 def delete_chat(chat_id: str):
-    """Delete a specific chat and its messages."""
+    """Delete a specific chat, its messages and documents no other chat uses."""
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM chat_messages WHERE chat_id = ?", (chat_id,))
     cursor.execute("DELETE FROM chat_history WHERE chat_id = ?", (chat_id,))
-    conn.commit()
+    cursor.execute("DELETE FROM chat_documents WHERE chat_id = ?", (chat_id,))
+    _delete_orphan_documents(cursor)
+    _commit(conn)
     cursor.close()
 
+@traced("db.rename_chat")
+@_serialized
 def rename_chat(chat_id: str, new_title: str):
     """Rename a specific chat."""
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("""
         UPDATE chat_history 
         SET title = ?, last_updated = CURRENT_TIMESTAMP
         WHERE chat_id = ?
     """, (new_title, chat_id))
-    conn.commit()
+    _commit(conn)
     cursor.close()
 
+@traced("db.clear_all_chats")
+@_serialized
 def clear_all_chats():
-    """Clear all chat history and checkpoint data."""
+    """Clear all chat history, documents and checkpoint data."""
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM chat_messages")
     cursor.execute("DELETE FROM chat_history")
-    cursor.execute("DELETE FROM checkpoints")
-    cursor.execute("DELETE FROM writes")
-    conn.commit()
+    cursor.execute("DELETE FROM chat_documents")
+    cursor.execute("DELETE FROM documents")
+    # LangGraph creates its tables only once the checkpointer has been used
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('checkpoints', 'writes')")
+    for (table,) in cursor.fetchall():
+        cursor.execute(f"DELETE FROM {table}")
+    _commit(conn)
     cursor.close()
 
+@traced("db.get_database_stats")
+@_serialized
 def get_database_stats() -> Dict:
     """Get statistics about the database."""
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute("SELECT COUNT(*) FROM chat_history")
@@ -185,6 +527,9 @@ def get_database_stats() -> Dict:
     
     cursor.execute("SELECT COUNT(*) FROM chat_messages WHERE search_used = 1")
     total_searches = cursor.fetchone()[0]
+
+    cursor.execute("SELECT COUNT(*) FROM documents")
+    total_documents = cursor.fetchone()[0]
     
     cursor.close()
     
@@ -192,7 +537,8 @@ def get_database_stats() -> Dict:
         "total_chats": total_chats,
         "total_messages": total_messages,
         "total_chars": total_chars,
-        "total_searches": total_searches
+        "total_searches": total_searches,
+        "total_documents": total_documents
     }
 
 def format_timestamp(timestamp_str: str) -> str:
@@ -230,8 +576,3 @@ def generate_chat_title(first_message: str) -> str:
         title += "..."
     return title
 
-# Export connection for checkpointer
-def get_db_connection():
-    """Get database connection for checkpointer."""
-    return conn
-
@@ -0,0 +1,87 @@
+import hashlib
+import io
+import os
+from typing import Dict
+
+from database import attach_document, get_document, save_document
+from tracing import traced
+
+# -------------------- FILE EXTRACTION --------------------
+
+# pypdf and python-docx are imported only when a PDF or DOCX is extracted.
+
+class NamedBytesIO(io.BytesIO):
+    """In-memory upload with the `name` and `size` attributes extractors expect."""
+
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+class ExtractionError(ValueError):
+    """An uploaded file could not be read."""
+
+TEXT_EXTENSIONS = [".txt", ".py", ".js", ".html", ".css", ".c", ".cpp", ".java", ".json", ".md"]
+
+@traced("file.extract")
+def extract_file_content(uploaded_file) -> str:
+    """
+    Extract text from an uploaded file.
+
+    Works with any file-like object exposing `name`, `size` and `read()`,
+    such as Streamlit's UploadedFile or a NamedBytesIO from the API server.
+
+    Raises:
+        ExtractionError: The file could not be read (e.g. invalid UTF-8 or a
+            corrupt PDF)
+    """
+    filename = uploaded_file.name
+    ext = os.path.splitext(filename)[1].lower()
+    try:
+        if ext in TEXT_EXTENSIONS:
+            return uploaded_file.read().decode("utf-8")
+        if ext == ".pdf":
+            from pypdf import PdfReader
+            reader = PdfReader(uploaded_file)
+            return "\n".join(page.extract_text() or "" for page in reader.pages)
+        if ext == ".docx":
+            from docx import Document
+            doc = Document(uploaded_file)
+            return "\n".join(p.text for p in doc.paragraphs)
+        return f"Uploaded file: {filename}\nFile type: {ext}\nSize: {uploaded_file.size} bytes\nThis is a binary or unsupported format."
+    except Exception as e:
+        raise ExtractionError(f"Error reading file {filename}: {str(e)}") from e
+
+
+# -------------------- DOCUMENT STORE --------------------
+
+def store_upload(chat_id: str, uploaded_file) -> Dict:
+    """
+    Attach an uploaded file to a chat through the document store.
+
+    Files are identified by a hash of their bytes, so text is extracted and
+    stored only the first time a given file is seen; uploading it again, to
+    this or any other chat, just adds a link. A file that cannot be read
+    raises ExtractionError and is neither stored nor attached, so a later
+    upload of the same bytes is tried again.
+
+    Returns:
+        Dict with content_hash, file_name, char_count and whether the
+        content was already stored (deduplicated)
+    """
+    data = uploaded_file.getvalue()
+    content_hash = hashlib.sha256(data).hexdigest()
+    document = get_document(content_hash)
+    if document is None:
+        text = extract_file_content(uploaded_file)
+        save_document(content_hash, uploaded_file.name, len(data), text)
+        char_count = len(text)
+    else:
+        char_count = document["char_count"]
+    attach_document(chat_id, content_hash, uploaded_file.name)
+    return {
+        "content_hash": content_hash,
+        "file_name": uploaded_file.name,
+        "char_count": char_count,
+        "deduplicated": document is not None
+    }
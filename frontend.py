@@ -1,15 +1,19 @@
 import streamlit as st
-from backend import run_chat_stream, MODELS, get_model_emoji
+from backend import run_chat_stream, build_messages, MODELS, get_model_emoji
+from cancellation import CancellationToken
 from database import (
     save_chat_metadata, save_chat_message, get_all_chats,
     get_chat_messages, get_chat_metadata, delete_chat, clear_all_chats,
-    generate_chat_title, format_timestamp, get_database_stats, rename_chat
+    generate_chat_title, format_timestamp, get_database_stats, rename_chat,
+    get_chat_documents, get_document_text, detach_document
 )
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from file_utils import ExtractionError, store_upload
+from session_store import sessions
+import tracing
+import queue
+import threading
 import uuid
-import os
-from pypdf import PdfReader
-from docx import Document
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 st.set_page_config(
     page_title="Universal Chatbot", 
@@ -30,14 +34,10 @@ st.markdown("""
 # SESSION STATE
 if "chat_id" not in st.session_state:
     st.session_state.chat_id = str(uuid.uuid4())
-if "history" not in st.session_state:
-    st.session_state.history = []
-if "file_context" not in st.session_state:
-    st.session_state.file_context = ""
-if "file_name" not in st.session_state:
-    st.session_state.file_name = None
-if "file_injected" not in st.session_state:
-    st.session_state.file_injected = False
+if "documents" not in st.session_state:
+    st.session_state.documents = []
+if "seen_uploads" not in st.session_state:
+    st.session_state.seen_uploads = set()
 if "selected_model" not in st.session_state:
     st.session_state.selected_model = "qwen2.5:0.5b"
 if "chat_title" not in st.session_state:
@@ -51,33 +51,69 @@ if "rename_mode" not in st.session_state:
 if "temp_title" not in st.session_state:
     st.session_state.temp_title = ""
 
-def extract_file_content(uploaded_file):
-    filename = uploaded_file.name
-    ext = os.path.splitext(filename)[1].lower()
-    try:
-        if ext in [".txt", ".py", ".js", ".html", ".css", ".c", ".cpp", ".java", ".json", ".md"]:
-            return uploaded_file.read().decode("utf-8")
-        if ext == ".pdf":
-            reader = PdfReader(uploaded_file)
-            return "\n".join(page.extract_text() or "" for page in reader.pages)
-        if ext == ".docx":
-            doc = Document(uploaded_file)
-            return "\n".join(p.text for p in doc.paragraphs)
-        return f"Uploaded file: {filename}\nFile type: {ext}\nSize: {uploaded_file.size} bytes\nThis is a binary or unsupported format."
-    except Exception as e:
-        return f"Error reading file {filename}: {str(e)}"
+def session_is_alive(session_id: str) -> bool:
+    """Whether the browser session that started a generation is still connected."""
+    from streamlit import runtime
+    return not runtime.exists() or runtime.get_instance().is_active_session(session_id)
+
+# How often the page is touched while waiting for the model, so a rerun
+# (e.g. the Stop button) interrupts the script without waiting for a chunk
+STREAM_POLL_S = 0.1
+
+def stream_in_background(stream):
+    """
+    Consume a run_chat_stream generator on a worker thread.
+
+    Yields its items as they arrive, and None every STREAM_POLL_S while
+    waiting (search, model load, prefill). Streamlit only interrupts a
+    script for a rerun at its next st.* call, so the caller updates the
+    page on None. Errors raised by the stream are re-raised here.
+    """
+    items = queue.Queue()
+
+    def consume():
+        try:
+            for item in stream:
+                items.put(("item", item))
+        except Exception as e:
+            items.put(("error", e))
+        finally:
+            stream.close()
+            items.put(("end", None))
+
+    threading.Thread(target=consume, name="chat-stream", daemon=True).start()
+    while True:
+        try:
+            kind, value = items.get(timeout=STREAM_POLL_S)
+        except queue.Empty:
+            yield None
+            continue
+        if kind == "end":
+            return
+        if kind == "error":
+            raise value
+        yield value
+
+# Only a recent window of the chat is held in memory (see session_store.py);
+# the full conversation is in chat_messages
+ctx = get_script_run_ctx()
+if "session_key" not in st.session_state:
+    st.session_state.session_key = ctx.session_id if ctx else str(uuid.uuid4())
+sessions.is_alive = session_is_alive
+chat_session = sessions.get(st.session_state.session_key, st.session_state.chat_id)
+
+def attached_file_name():
+    """Name of the most recently attached document, shown in the chat list."""
+    return st.session_state.documents[-1]["file_name"] if st.session_state.documents else None
 
 def load_chat_history(chat_id: str):
-    messages = get_chat_messages(chat_id)
+    chat_session.open(chat_id)
     metadata = get_chat_metadata(chat_id)
-    if messages:
-        st.session_state.history = [{"role": msg["role"], "content": msg["content"], "search_used": msg.get("search_used", False)} for msg in messages]
-    else:
-        st.session_state.history = []
     if metadata:
         st.session_state.chat_title = metadata["title"]
         st.session_state.selected_model = metadata["model"]
-        st.session_state.file_name = metadata["file_name"]
+    # Metadata only; document text is read from the store when a prompt is built
+    st.session_state.documents = get_chat_documents(chat_id)
 
 # SIDEBAR
 with st.sidebar:
@@ -86,10 +122,8 @@ with st.sidebar:
     with col1:
         if st.button("➕ New", use_container_width=True, type="primary"):
             st.session_state.chat_id = str(uuid.uuid4())
-            st.session_state.history = []
-            st.session_state.file_context = ""
-            st.session_state.file_name = None
-            st.session_state.file_injected = False
+            chat_session.reset(st.session_state.chat_id)
+            st.session_state.documents = []
             st.session_state.chat_title = "New Chat"
             st.session_state.confirm_clear = False
             st.session_state.rename_mode = False
@@ -108,16 +142,46 @@ with st.sidebar:
         with col2:
             st.metric("Searches", stats["total_searches"])
             st.metric("Characters", f"{stats['total_chars']:,}")
+        
+        if tracing.is_enabled():
+            st.markdown("### ⏱️ Latency")
+            by_model = tracing.model_breakdown()
+            if by_model:
+                st.caption("Mean per turn (ms), by model")
+                st.dataframe([
+                    {
+                        "Model": f"{get_model_emoji(model)} {model}",
+                        "Turns": stages["turns"],
+                        "Total": round(stages["total"]),
+                        "Search": round(stages.get("chat.search", 0)),
+                        "Prefill": round(stages.get("chat.prefill", 0)),
+                        "Stream": round(stages.get("chat.stream", 0))
+                    }
+                    for model, stages in by_model.items()
+                ], hide_index=True, use_container_width=True)
+            stages = tracing.stage_summary()
+            if stages:
+                st.caption("Per stage (ms)")
+                st.dataframe([
+                    {
+                        "Stage": name,
+                        "Calls": info["count"],
+                        "p50": round(info["p50_ms"], 1),
+                        "p95": round(info["p95_ms"], 1),
+                        "Max": round(info["max_ms"], 1)
+                    }
+                    for name, info in stages.items()
+                ], hide_index=True, use_container_width=True)
+            else:
+                st.caption("No timings recorded yet")
         st.divider()
     
     if st.button("🗑️ Clear All", use_container_width=True, type="secondary"):
         if st.session_state.confirm_clear:
             clear_all_chats()
             st.session_state.chat_id = str(uuid.uuid4())
-            st.session_state.history = []
-            st.session_state.file_context = ""
-            st.session_state.file_name = None
-            st.session_state.file_injected = False
+            chat_session.reset(st.session_state.chat_id)
+            st.session_state.documents = []
             st.session_state.chat_title = "New Chat"
             st.session_state.confirm_clear = False
             st.session_state.rename_mode = False
@@ -153,8 +217,6 @@ with st.sidebar:
                     if st.button(button_label, key=f"load_{chat['chat_id']}", use_container_width=True, type="primary" if is_current else "secondary"):
                         st.session_state.chat_id = chat['chat_id']
                         load_chat_history(chat['chat_id'])
-                        st.session_state.file_context = ""
-                        st.session_state.file_injected = False
                         st.session_state.confirm_clear = False
                         st.session_state.rename_mode = False
                         st.rerun()
@@ -171,9 +233,9 @@ with st.sidebar:
                         delete_chat(chat['chat_id'])
                         if chat['chat_id'] == st.session_state.chat_id:
                             st.session_state.chat_id = str(uuid.uuid4())
-                            st.session_state.history = []
+                            chat_session.reset(st.session_state.chat_id)
                             st.session_state.chat_title = "New Chat"
-                            st.session_state.file_name = None
+                            st.session_state.documents = []
                             st.session_state.rename_mode = False
                         st.rerun()
                 st.divider()
@@ -217,28 +279,40 @@ with col2:
     model_emoji = get_model_emoji(st.session_state.selected_model)
     st.metric("Model", f"{model_emoji}")
 with col3:
-    if st.session_state.file_name:
-        st.metric("File", "📎")
+    if st.session_state.documents:
+        st.metric("Files", f"📎 {len(st.session_state.documents)}")
     else:
-        st.metric("File", "—")
+        st.metric("Files", "—")
 
 st.divider()
 
 # CHAT HISTORY
+def render_message(i: int, msg):
+    with st.chat_message(msg["role"]):
+        st.markdown(msg["content"])
+        if msg["role"] == "assistant":
+            col_copy, col_search = st.columns([1, 4])
+            with col_copy:
+                if st.button("📋 Copy", key=f"copy_{i}"):
+                    st.code(msg["content"], language=None)
+                    st.success("✅ Copied to display! Use Ctrl+C to copy from the code block above.")
+            if msg.get("search_used", False):
+                with col_search:
+                    st.caption("🔍 Web search used")
+            if msg.get("stopped", False):
+                with col_search:
+                    st.caption("⏹️ Stopped")
+
 chat_container = st.container()
 with chat_container:
-    for i, msg in enumerate(st.session_state.history):
-        with st.chat_message(msg["role"]):
-            st.markdown(msg["content"])
-            if msg["role"] == "assistant":
-                col_copy, col_search = st.columns([1, 4])
-                with col_copy:
-                    if st.button("📋 Copy", key=f"copy_{i}"):
-                        st.code(msg["content"], language=None)
-                        st.success("✅ Copied to display! Use Ctrl+C to copy from the code block above.")
-                if msg.get("search_used", False):
-                    with col_search:
-                        st.caption("🔍 Web search used")
+    window = chat_session.messages
+    earlier = chat_session.earlier_count
+    # Older messages are read from the database only when asked for
+    if earlier and st.toggle(f"🕐 Show {earlier} earlier messages", key="show_earlier"):
+        for i, msg in enumerate(get_chat_messages(st.session_state.chat_id)[:earlier]):
+            render_message(i, msg)
+    for i, msg in enumerate(window, start=earlier):
+        render_message(i, msg)
 
 # CONTROLS
 st.divider()
@@ -260,20 +334,37 @@ with col1:
 
 with col2:
     st.markdown("### 📎 File Upload")
-    uploaded_file = st.file_uploader("Attach a file", type=None, key="file_uploader", help="Upload any file type")
-    if uploaded_file:
-        content = extract_file_content(uploaded_file)
-        if content != st.session_state.file_context:
-            st.session_state.file_context = content
-            st.session_state.file_name = uploaded_file.name
-            st.session_state.file_injected = False
-            st.success(f"✅ Loaded")
+    uploaded_files = st.file_uploader("Attach files", type=None, key="file_uploader", accept_multiple_files=True, help="Upload any file type")
+    # The uploader keeps its files across reruns: attach each upload only once
+    new_uploads = [f for f in uploaded_files or [] if f.file_id not in st.session_state.seen_uploads]
+    loaded = 0
+    for uploaded_file in new_uploads:
+        st.session_state.seen_uploads.add(uploaded_file.file_id)
+        try:
+            store_upload(st.session_state.chat_id, uploaded_file)
+            loaded += 1
+        except ExtractionError as e:
+            st.error(f"❌ {e}")
+    if loaded:
+        st.session_state.documents = get_chat_documents(st.session_state.chat_id)
+        st.success(f"✅ Loaded")
 
-if st.session_state.file_context:
-    with st.expander(f"📄 View File: {st.session_state.file_name or 'Uploaded File'}"):
-        preview_length = min(1500, len(st.session_state.file_context))
-        st.code(st.session_state.file_context[:preview_length] + ("...\n[Content truncated]" if len(st.session_state.file_context) > preview_length else ""), language=None)
-        st.caption(f"Total characters: {len(st.session_state.file_context):,}")
+if st.session_state.documents:
+    with st.expander(f"📄 Attached Files ({len(st.session_state.documents)})"):
+        for doc in st.session_state.documents:
+            col_doc, col_remove = st.columns([5, 1])
+            with col_doc:
+                st.markdown(f"**{doc['file_name']}**")
+                st.caption(f"Total characters: {doc['char_count']:,}")
+                if st.toggle("Preview", key=f"preview_{doc['content_hash']}"):
+                    text = get_document_text(doc["content_hash"]) or ""
+                    preview_length = min(1500, len(text))
+                    st.code(text[:preview_length] + ("...\n[Content truncated]" if len(text) > preview_length else ""), language=None)
+            with col_remove:
+                if st.button("🗑️", key=f"detach_{doc['content_hash']}", help="Remove from this chat"):
+                    detach_document(st.session_state.chat_id, doc["content_hash"])
+                    st.session_state.documents = get_chat_documents(st.session_state.chat_id)
+                    st.rerun()
 
 st.divider()
 
@@ -281,61 +372,109 @@ st.divider()
 user_input = st.chat_input("💬 Type your message here...")
 
 if user_input:
-    if not st.session_state.history:
+    if not chat_session.total:
         st.session_state.chat_title = generate_chat_title(user_input)
-    st.session_state.history.append({"role": "user", "content": user_input, "search_used": False})
     save_chat_message(st.session_state.chat_id, "user", user_input, False)
+    chat_session.append("user", user_input)
     st.session_state.rename_mode = False  # Exit rename mode when sending a message
     st.rerun()
 
+def stop_generation():
+    """
+    Stop button callback: keep the reply the click interrupted, marked stopped.
+
+    Runs at the start of the rerun, after the interrupted run stashed its
+    partial reply. Any other rerun discards the stash below, leaving the
+    user turn unanswered so the reply is generated again.
+    """
+    reply = st.session_state.pop("interrupted_reply", None)
+    if reply is None:
+        return
+    save_chat_message(reply["chat_id"], "assistant", reply["content"], reply["search_used"], True)
+    save_chat_metadata(reply["chat_id"], reply["title"], reply["model"], reply["file_name"])
+    session = sessions.get(st.session_state.session_key)
+    if session.chat_id == reply["chat_id"]:
+        session.append("assistant", reply["content"], reply["search_used"], True)
+
+st.session_state.pop("interrupted_reply", None)
+
 # PROCESS RESPONSE
-if st.session_state.history and st.session_state.history[-1]["role"] == "user":
-    last_user_msg = st.session_state.history[-1]["content"]
-    messages = []
-    if st.session_state.file_context and not st.session_state.file_injected:
-        messages.append(SystemMessage(content=f"The user has uploaded a file named '{st.session_state.file_name}'. Use its content to answer their questions.\n\nFILE CONTENT:\n{st.session_state.file_context}"))
-        st.session_state.file_injected = True
-    for msg in st.session_state.history[:-1]:
-        if msg["role"] == "user":
-            messages.append(HumanMessage(content=msg["content"]))
-        else:
-            messages.append(AIMessage(content=msg["content"]))
-    messages.append(HumanMessage(content=last_user_msg))
+if chat_session.messages and chat_session.messages[-1].role == "user":
+    last_user_msg = chat_session.messages[-1].content
+    # The prompt gets the whole conversation, read from the database per turn
+    messages = build_messages(get_chat_messages(st.session_state.chat_id), st.session_state.documents)
     
     with st.chat_message("user"):
         st.markdown(last_user_msg)
     
+    # Any widget click reruns the script and interrupts this loop, even
+    # before the first chunk; only the Stop button keeps the partial reply.
+    # The monitor also cancels once the browser session is gone.
+    session_id = ctx.session_id if ctx else None
+    cancel_token = CancellationToken(is_alive=(lambda: session_is_alive(session_id)) if session_id else None)
+    full_response = ""
+    search_used = False
+    finished = False
     try:
         with st.chat_message("assistant"):
             message_placeholder = st.empty()
-            full_response = ""
-            search_used = False
+            st.button("⏹️ Stop", key="stop_generation", help="Stop generating", on_click=stop_generation)
             st.session_state.generating = True
+            chat_session.busy = True
             
             with st.spinner("⏳ Generating..."):
-                for chunk, metadata, search_flag in run_chat_stream(messages, st.session_state.chat_id, st.session_state.selected_model, force_search=False, enable_auto_search=True):
+                stream = run_chat_stream(messages, st.session_state.chat_id, st.session_state.selected_model, force_search=False, enable_auto_search=True, cancel_token=cancel_token)
+                for item in stream_in_background(stream):
+                    if item is None:
+                        # Still waiting: touching the page lets a pending rerun interrupt us
+                        message_placeholder.markdown(full_response + "▋")
+                        continue
+                    chunk, metadata, search_flag = item
                     search_used = search_flag
                     if chunk.content:
                         full_response += chunk.content
                         message_placeholder.markdown(full_response + "▋")
             
+            stopped = cancel_token.cancelled
             message_placeholder.markdown(full_response)
             if search_used:
                 st.caption("🔍 Web search used")
+            if stopped:
+                st.caption("⏹️ Stopped")
             st.session_state.generating = False
+            chat_session.busy = False
         
-        st.session_state.history.append({"role": "assistant", "content": full_response, "search_used": search_used})
-        save_chat_message(st.session_state.chat_id, "assistant", full_response, search_used)
-        save_chat_metadata(st.session_state.chat_id, st.session_state.chat_title, st.session_state.selected_model, st.session_state.file_name)
+        save_chat_message(st.session_state.chat_id, "assistant", full_response, search_used, stopped)
+        chat_session.append("assistant", full_response, search_used, stopped)
+        save_chat_metadata(st.session_state.chat_id, st.session_state.chat_title, st.session_state.selected_model, attached_file_name())
         st.session_state.confirm_clear = False
+        finished = True
     except Exception as e:
         error_msg = f"❌ Error: {str(e)}"
-        st.session_state.history.append({"role": "assistant", "content": error_msg, "search_used": False})
         save_chat_message(st.session_state.chat_id, "assistant", error_msg, False)
+        chat_session.append("assistant", error_msg)
         with st.chat_message("assistant"):
             st.error(error_msg)
             st.caption("💡 Tip: Try switching to a different model or check if Ollama is running")
         st.session_state.generating = False
+        chat_session.busy = False
+        finished = True
+    finally:
+        if not finished:
+            # Interrupted by a rerun: free the Ollama connection and stash the
+            # partial reply for stop_generation, which saves it only if the
+            # rerun came from the Stop button
+            cancel_token.cancel()
+            st.session_state.interrupted_reply = {
+                "chat_id": st.session_state.chat_id,
+                "content": full_response,
+                "search_used": search_used,
+                "title": st.session_state.chat_title,
+                "model": st.session_state.selected_model,
+                "file_name": attached_file_name()
+            }
+            st.session_state.generating = False
+            chat_session.busy = False
 
 # FOOTER
 st.divider()
@@ -345,5 +484,5 @@ with footer_col1:
 with footer_col2:
     st.caption(f"🤖 Model: {st.session_state.selected_model}")
 with footer_col3:
-    msg_count = len(st.session_state.history)
+    msg_count = chat_session.total
     st.caption(f"💬 Messages: {msg_count}")
@@ -0,0 +1,245 @@
+"""
+Bounded per-session chat memory.
+
+Every chat message is saved to chat_messages as it is sent, so a browser
+session only needs to hold what it renders. Each session keeps a recent
+window of its chat as compact Message objects; older messages stay in the
+database. A process-wide SessionStore tracks the approximate size of all
+windows and, when the total exceeds the memory budget, evicts the windows
+of the least recently used sessions. An evicted session rehydrates its
+window from the database the next time it is used.
+
+Configuration (environment):
+    CHATBOT_HISTORY_WINDOW=50        Messages kept in memory per session
+    CHATBOT_SESSION_MEMORY_MB=64     Budget for all sessions' windows
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from database import get_recent_chat_messages
+
+# -------------------- CONFIGURATION --------------------
+
+HISTORY_WINDOW = int(os.environ.get("CHATBOT_HISTORY_WINDOW", "50"))
+MEMORY_BUDGET_BYTES = int(float(os.environ.get("CHATBOT_SESSION_MEMORY_MB", "64")) * 1024 * 1024)
+
+# -------------------- MESSAGES --------------------
+
+class Message:
+    """
+    One chat message, about a third the size of the equivalent dict.
+
+    Supports msg["role"] and msg.get("stopped") so it can be used wherever
+    history dicts are expected (e.g. build_messages).
+    """
+
+    __slots__ = ("role", "content", "search_used", "stopped")
+
+    def __init__(self, role: str, content: str, search_used: bool = False, stopped: bool = False):
+        self.role = sys.intern(role)
+        self.content = content
+        self.search_used = bool(search_used)
+        self.stopped = bool(stopped)
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def nbytes(self) -> int:
+        """Approximate memory held by this message."""
+        return sys.getsizeof(self) + sys.getsizeof(self.content)
+
+# -------------------- SESSIONS --------------------
+
+class ChatSession:
+    """The in-memory view of one browser session's current chat."""
+
+    __slots__ = ("store", "key", "chat_id", "total", "last_used", "busy", "_messages", "_nbytes")
+
+    def __init__(self, store: "SessionStore", key: str, chat_id: Optional[str] = None):
+        self.store = store
+        self.key = key
+        self.chat_id = chat_id
+        self.total = 0
+        self.last_used = time.monotonic()
+        self.busy = False
+        self._messages: Optional[List[Message]] = []
+        self._nbytes = 0
+
+    @property
+    def resident(self) -> bool:
+        """Whether the message window is in memory (False once evicted)."""
+        return self._messages is not None
+
+    @property
+    def messages(self) -> List[Message]:
+        """The recent window of messages, rehydrated from the database if evicted."""
+        self.store.touch(self)
+        if self._messages is None:
+            self.store.rehydrations += 1
+            self._rehydrate()
+        return self._messages
+
+    @property
+    def earlier_count(self) -> int:
+        """Messages of this chat that are only in the database."""
+        return max(0, self.total - len(self.messages))
+
+    def open(self, chat_id: str):
+        """Switch to an existing chat, loading its recent window."""
+        self.chat_id = chat_id
+        self._rehydrate()
+        self.store.touch(self)
+
+    def reset(self, chat_id: str):
+        """Switch to a new, empty chat."""
+        self.chat_id = chat_id
+        self.total = 0
+        self._replace([])
+        self.store.touch(self)
+
+    def append(self, role: str, content: str, search_used: bool = False, stopped: bool = False):
+        """Add a message (already saved to the database) and trim the window."""
+        with self.store.lock:
+            self.store.touch(self)
+            if self._messages is None:
+                # Evicted: the reloaded window already holds the saved message
+                self.store.rehydrations += 1
+                self._rehydrate()
+                return
+            messages = self._messages
+            message = Message(role, content, search_used, stopped)
+            messages.append(message)
+            self.total += 1
+            delta = message.nbytes()
+            while len(messages) > self.store.window:
+                delta -= messages.pop(0).nbytes()
+            self._nbytes += delta
+            self.store.adjust(self, delta)
+
+    def _drop(self) -> int:
+        """Drop the message window; returns the bytes released."""
+        released = self._nbytes
+        self._messages = None
+        self._nbytes = 0
+        return released
+
+    def _rehydrate(self):
+        page = get_recent_chat_messages(self.chat_id, self.store.window) if self.chat_id else {"total": 0, "messages": []}
+        self.total = page["total"]
+        self._replace([
+            Message(m["role"], m["content"], m["search_used"], m["stopped"])
+            for m in page["messages"]
+        ])
+
+    def _replace(self, messages: List[Message]):
+        nbytes = sum(m.nbytes() for m in messages)
+        with self.store.lock:
+            delta = nbytes - self._nbytes
+            self._messages = messages
+            self._nbytes = nbytes
+            self.store.adjust(self, delta)
+
+# -------------------- STORE --------------------
+
+class SessionStore:
+    """
+    Process-wide registry of chat sessions under a shared memory budget.
+
+    Args:
+        budget_bytes: Approximate total size allowed for all message windows
+        window: Messages each session keeps in memory
+        is_alive: Optional check of whether a session key is still connected;
+            sessions that are gone are dropped when a new session is created
+    """
+
+    def __init__(self, budget_bytes: int = MEMORY_BUDGET_BYTES, window: int = HISTORY_WINDOW,
+                 is_alive: Optional[Callable[[str], bool]] = None):
+        self.budget_bytes = budget_bytes
+        self.window = window
+        self.is_alive = is_alive
+        self.lock = threading.RLock()
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._nbytes = 0
+        self.evictions = 0
+        self.rehydrations = 0
+
+    def get(self, key: str, chat_id: Optional[str] = None) -> ChatSession:
+        """Get the session for a key, creating an empty one for chat_id if needed."""
+        with self.lock:
+            session = self._sessions.get(key)
+            if session is None:
+                self._prune()
+                session = ChatSession(self, key, chat_id)
+                self._sessions[key] = session
+            return session
+
+    def discard(self, key: str):
+        """Forget a session entirely."""
+        with self.lock:
+            session = self._sessions.pop(key, None)
+            if session is not None:
+                self._nbytes -= session._drop()
+
+    def touch(self, session: ChatSession):
+        """Mark a session as most recently used."""
+        session.last_used = time.monotonic()
+        with self.lock:
+            if self._sessions.get(session.key) is session:
+                self._sessions.move_to_end(session.key)
+
+    def adjust(self, session: ChatSession, delta: int):
+        """Account for a change in a session's window size and enforce the budget."""
+        with self.lock:
+            if self._sessions.get(session.key) is not session:
+                return
+            self._nbytes += delta
+            if self._nbytes > self.budget_bytes:
+                self._evict(keep=session)
+
+    def _evict(self, keep: ChatSession):
+        # Least recently used first; never the session being served or one
+        # that is generating a reply
+        for session in list(self._sessions.values()):
+            if self._nbytes <= self.budget_bytes:
+                break
+            if session is keep or session.busy or not session.resident:
+                continue
+            self._nbytes -= session._drop()
+            self.evictions += 1
+
+    def _prune(self):
+        if self.is_alive is None:
+            return
+        for key in list(self._sessions):
+            try:
+                alive = self.is_alive(key)
+            except Exception:
+                alive = True
+            if not alive:
+                self.discard(key)
+
+    def memory_usage(self) -> Dict:
+        """Sessions held, how many have their window in memory, and its approximate size."""
+        with self.lock:
+            sessions = list(self._sessions.values())
+            return {
+                "sessions": len(sessions),
+                "resident_sessions": sum(s.resident for s in sessions),
+                "bytes": self._nbytes,
+                "budget_bytes": self.budget_bytes,
+                "evictions": self.evictions,
+                "rehydrations": self.rehydrations
+            }
+
+sessions = SessionStore()
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Run against a throwaway database; the path is read when `database` is
+# first imported, so this has to happen before any test module imports it
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+os.environ["CHATBOT_DB"] = os.path.join(tempfile.mkdtemp(prefix="chatbot-test-"), "chat_memory.db")
@@ -0,0 +1,92 @@
+"""
+End-to-end test of the HTTP/SSE API against the fake Ollama server.
+"""
+
+import asyncio
+import json
+
+import aiohttp
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from api import create_app
+from bench.fake_ollama import FakeOllama
+
+TOKENS = 100
+
+@pytest.fixture
+def ollama(monkeypatch):
+    with FakeOllama(tokens_per_sec=200, first_token_ms=20, tokens=TOKENS) as server:
+        monkeypatch.setenv("OLLAMA_HOST", server.url)
+        yield server
+
+async def _events(response: aiohttp.ClientResponse):
+    """Yield (event, data) pairs from a Server-Sent Events response."""
+    event = None
+    async for raw in response.content:
+        line = raw.decode("utf-8").rstrip("\n")
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            yield event, json.loads(line[len("data: "):])
+
+async def _scenario(client: TestClient):
+    response = await client.post("/chats", json={"title": "Release notes"})
+    assert response.status == 201
+    chat_id = (await response.json())["chat_id"]
+
+    form = aiohttp.FormData()
+    form.add_field("file", b"The release ships on 12 March.", filename="notes.txt")
+    response = await client.post(f"/chats/{chat_id}/files", data=form)
+    assert response.status == 201
+    content_hash = (await response.json())["content_hash"]
+
+    # Unreadable files are rejected and not stored
+    form = aiohttp.FormData()
+    form.add_field("file", b"\xff\xfe not utf-8", filename="broken.txt")
+    response = await client.post(f"/chats/{chat_id}/files", data=form)
+    assert response.status == 422
+
+    # A full reply, streamed token by token
+    response = await client.post(f"/chats/{chat_id}/messages",
+                                 json={"content": "When does it ship?", "enable_auto_search": False})
+    assert response.status == 200
+    events = [event async for event in _events(response)]
+    assert events[0][0] == "start"
+    tokens = [data["content"] for event, data in events if event == "token"]
+    done = events[-1]
+    assert done[0] == "done"
+    assert not done[1]["stopped"]
+    assert done[1]["content"] == "".join(tokens)
+    assert len(tokens) == TOKENS
+
+    # A reply stopped after its first token
+    response = await client.post(f"/chats/{chat_id}/messages",
+                                 json={"content": "Tell me more", "enable_auto_search": False})
+    stopped_tokens = []
+    async for event, data in _events(response):
+        if event == "token":
+            stopped_tokens.append(data["content"])
+            if len(stopped_tokens) == 1:
+                stop = await client.post(f"/chats/{chat_id}/stop")
+                assert (await stop.json())["stopped"] == 1
+        elif event == "done":
+            assert data["stopped"]
+            assert data["stop_reason"] == "stopped"
+    assert 0 < len(stopped_tokens) < TOKENS
+
+    response = await client.get(f"/chats/{chat_id}")
+    chat = await response.json()
+    assert chat["title"] == "Release notes"
+    assert [d["content_hash"] for d in chat["documents"]] == [content_hash]
+    assert [(m["role"], m["stopped"]) for m in chat["messages"]] == [
+        ("user", False), ("assistant", False), ("user", False), ("assistant", True)
+    ]
+    assert chat["messages"][1]["content"] == "".join(tokens)
+    assert chat["messages"][3]["content"] == "".join(stopped_tokens)
+
+def test_chat_upload_stream_and_stop(ollama):
+    async def run():
+        async with TestClient(TestServer(create_app(max_streams=4))) as client:
+            await _scenario(client)
+    asyncio.run(run())
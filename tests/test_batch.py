@@ -0,0 +1,34 @@
+"""
+Batch runner resume behaviour, with generation stubbed out.
+"""
+
+import json
+
+import pytest
+
+import batch
+
+def _fake_run_prompt(item, model_name, thread_id, cancel_token, auto_search=True):
+    return {"id": item["id"], "status": "ok", "response": "café", "tokens": 1}
+
+@pytest.mark.parametrize("tail", [
+    b'{"id":"b","response":"caf\xc3\xa9',   # complete character, line cut short
+    b'{"id":"b","response":"caf\xc3',       # cut inside a character
+])
+def test_resume_after_truncated_write(tmp_path, monkeypatch, tail):
+    monkeypatch.setattr(batch, "run_prompt", _fake_run_prompt)
+    prompts = tmp_path / "prompts.jsonl"
+    prompts.write_text("".join(json.dumps({"id": i, "prompt": "hi"}) + "\n" for i in "abc"), encoding="utf-8")
+    results = tmp_path / "results.jsonl"
+    results.write_bytes(json.dumps({"id": "a", "status": "ok", "response": "déjà"}, ensure_ascii=False).encode("utf-8")
+                        + b"\n" + tail)
+
+    summary = batch.run_batch(str(prompts), str(results))
+
+    assert summary["skipped"] == 1
+    assert summary["ok"] == 2
+    lines = results.read_bytes().split(b"\n")
+    assert lines[1] == tail
+    records = [json.loads(line) for line in lines[2:] if line]
+    assert sorted(r["id"] for r in records) == ["b", "c"]
+    assert batch.completed_ids(str(results)) == {"a", "b", "c"}
@@ -0,0 +1,91 @@
+"""
+Session store: window trimming, LRU eviction under budget and rehydration.
+"""
+
+import uuid
+
+import pytest
+
+from database import create_chat, save_chat_message
+from session_store import Message, SessionStore
+
+def _chat(messages: int = 0) -> str:
+    chat_id = str(uuid.uuid4())
+    create_chat(chat_id, "Test chat", "qwen2.5:0.5b")
+    for i in range(messages):
+        save_chat_message(chat_id, "user" if i % 2 == 0 else "assistant", f"message {i} " + "x" * 200, False)
+    return chat_id
+
+def _send(session, content: str):
+    # As in the app: saved first, then added to the window
+    save_chat_message(session.chat_id, "user", content, False)
+    session.append("user", content)
+
+def _window_bytes(messages) -> int:
+    return sum(m.nbytes() for m in messages)
+
+def test_window_is_trimmed():
+    store = SessionStore(budget_bytes=10 ** 7, window=3)
+    session = store.get("s1")
+    session.open(_chat(5))
+    assert [m.content.split()[1] for m in session.messages] == ["2", "3", "4"]
+    assert session.total == 5
+    assert session.earlier_count == 2
+
+    _send(session, "newest")
+    assert [m.content for m in session.messages][-1] == "newest"
+    assert len(session.messages) == 3
+    assert session.total == 6
+    assert store.memory_usage()["bytes"] == _window_bytes(session.messages)
+
+def test_lru_eviction_and_rehydration():
+    one = _window_bytes([Message("user", "message 0 " + "x" * 200)])
+    store = SessionStore(budget_bytes=int(one * 2.5 * 2), window=2)
+    sessions = []
+    for key in ("a", "b", "c"):
+        session = store.get(key)
+        session.open(_chat(2))
+        sessions.append(session)
+    a, b, c = sessions
+
+    # Opening c exceeded the budget: a, the least recently used, was dropped
+    assert not a.resident and b.resident and c.resident
+    assert store.evictions == 1
+    assert store.memory_usage()["bytes"] <= store.budget_bytes
+
+    # Using a again rehydrates it from the database and evicts b instead
+    assert [m.content.split()[1] for m in a.messages] == ["0", "1"]
+    assert store.rehydrations == 1
+    _send(a, "after rehydration")
+    assert a.resident and not b.resident
+    assert a.total == 3
+
+def test_append_to_evicted_window_is_not_doubled():
+    store = SessionStore(budget_bytes=10 ** 7, window=5)
+    session = store.get("s1")
+    session.open(_chat(2))
+    store._nbytes -= session._drop()
+
+    _send(session, "while evicted")
+    assert session.total == 3
+    assert [m.content for m in session.messages].count("while evicted") == 1
+    assert store.memory_usage()["bytes"] == _window_bytes(session.messages)
+
+@pytest.mark.parametrize("exempt", ["busy", "keep"])
+def test_busy_and_current_sessions_are_not_evicted(exempt):
+    one = _window_bytes([Message("user", "message 0 " + "x" * 200)])
+    store = SessionStore(budget_bytes=int(one * 2.5), window=2)
+    first = store.get("first")
+    first.open(_chat(2))
+    if exempt == "busy":
+        first.busy = True
+        second = store.get("second")
+        second.open(_chat(2))
+        # Over budget, but the only other session is generating a reply
+        assert first.resident and second.resident
+        assert store.evictions == 0
+    else:
+        # A single session larger than the budget keeps its own window
+        _send(first, "x" * 2000)
+        assert first.resident
+        assert store.evictions == 0
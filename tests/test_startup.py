@@ -0,0 +1,21 @@
+"""
+Importing the core modules must not load the heavy dependencies they use lazily.
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from bench.startup import LAZY_MODULES, REPO_ROOT
+
+@pytest.mark.parametrize("module", ["backend", "database", "file_utils"])
+def test_import_is_lazy(module):
+    result = subprocess.run(
+        [sys.executable, "-c", f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))"],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    loaded = json.loads(result.stdout)
+    eager = [m for m in LAZY_MODULES if any(l == m or l.startswith(m + ".") for l in loaded)]
+    assert eager == [], f"importing {module} loaded {eager}"
@@ -0,0 +1,18 @@
+"""
+Trace export must never fail the traced turn.
+"""
+
+import tracing
+
+def test_failed_export_is_disabled(tmp_path, caplog):
+    tracing.set_export_path(str(tmp_path / "missing-dir" / "traces.jsonl"))
+    try:
+        for _ in range(2):
+            trace = tracing.Trace("chat.turn")
+            with trace.span("chat.stream"):
+                pass
+            trace.finish()
+        assert tracing._export_path is None
+        assert len([r for r in caplog.records if "Trace export" in r.getMessage()]) == 1
+    finally:
+        tracing.set_export_path(None)
@@ -0,0 +1,92 @@
+"""
+Unit tests for the web search post-processing pipeline.
+"""
+
+import threading
+
+import web_search
+
+def _snippet(text, url=None, title=""):
+    return web_search.Snippet(title=title, url=url, text=text, score=0.0, hits=1)
+
+def test_query_variants():
+    variants = web_search.generate_query_variants("Can you tell me what is the capital of France?")
+    assert variants[0] == "the capital of france"
+    assert "capital france" in variants
+    assert len(variants) == len(set(v.lower() for v in variants)) <= web_search.MAX_VARIANTS
+
+def test_parse_list_results():
+    raw = [
+        {"snippet": "Paris is  the capital.", "title": "France", "link": "https://a.example/paris"},
+        {"body": "Lyon is a city.", "href": "https://b.example/lyon"},
+        {"snippet": ""},
+        "not a record",
+    ]
+    snippets = web_search.parse_results(raw)
+    assert [(s["text"], s["url"]) for s in snippets] == [
+        ("Paris is the capital.", "https://a.example/paris"),
+        ("Lyon is a city.", "https://b.example/lyon"),
+    ]
+    assert snippets[0]["title"] == "France"
+
+def test_parse_string_results():
+    raw = ("snippet: Paris is the capital, title: France, link: https://a.example/paris, "
+           "snippet: Lyon is a city, title: Lyon, link: https://b.example/lyon")
+    snippets = web_search.parse_results(raw)
+    assert [(s["text"], s["title"], s["url"]) for s in snippets] == [
+        ("Paris is the capital", "France", "https://a.example/paris"),
+        ("Lyon is a city", "Lyon", "https://b.example/lyon"),
+    ]
+    # Plain text is split into sentence groups without URLs
+    plain = web_search.parse_results("First sentence. " * 30)
+    assert plain and all(s["url"] is None for s in plain)
+
+def test_dedupe_merges_urls_and_near_duplicates():
+    snippets = [
+        _snippet("Paris is the capital of France", "https://www.a.example/paris/"),
+        _snippet("Completely different wording here", "http://a.example/paris#top"),
+        _snippet("Paris is the capital of France.", "https://c.example/other"),
+        _snippet("Lyon has famous food markets", "https://d.example/lyon"),
+    ]
+    kept = web_search.dedupe(snippets)
+    assert [s["url"] for s in kept] == ["https://www.a.example/paris/", "https://d.example/lyon"]
+    assert kept[0]["hits"] == 3
+
+def test_rank_orders_and_drops_irrelevant():
+    snippets = [
+        _snippet("Lyon has famous food markets"),
+        _snippet("The capital of France is Paris"),
+        _snippet("Weather report for the weekend"),
+    ]
+    ranked = web_search.rank(snippets, "What is the capital of France?")
+    assert [s["text"] for s in ranked] == ["The capital of France is Paris"]
+    assert ranked[0]["score"] > 0
+
+def test_pack_respects_budget():
+    snippets = [_snippet("word " * 200, title=f"Result {i}") for i in range(5)]
+    packed = web_search.pack(snippets, budget=300)
+    assert packed.count("[") == 1
+    assert web_search.estimate_tokens(packed) <= 300
+    # The top result is trimmed rather than dropped when it alone is over budget
+    trimmed = web_search.pack(snippets, budget=50)
+    assert trimmed.startswith("[1] Result 0") and trimmed.endswith(" ...")
+    assert web_search.estimate_tokens(trimmed) <= 51
+
+def test_fan_out_drops_and_cancels_late_queries(monkeypatch):
+    monkeypatch.setattr(web_search, "SEARCH_WORKERS", 1)
+    monkeypatch.setattr(web_search, "_executor", None)
+    release = threading.Event()
+    started = []
+
+    def run(query):
+        started.append(query)
+        release.wait(2)
+        return query
+
+    try:
+        assert web_search.fan_out(run, ["a", "b", "c"], deadline_s=0.1) == []
+    finally:
+        release.set()
+        web_search._get_executor().shutdown(wait=True)
+    # Only the query that was already running ever started
+    assert started == ["a"]
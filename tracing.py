@@ -0,0 +1,244 @@
+"""
+Lightweight in-process tracing.
+
+Spans time individual stages (web search, file extraction, database calls,
+prompt prefill, token streaming). Every finished span feeds a per-stage
+aggregate; spans opened on a Trace are also grouped into that trace, which
+is kept in a ring buffer of recent traces and optionally appended to a
+JSONL file.
+
+Configuration (environment):
+    CHATBOT_TRACING=0         Disable tracing; decorated functions are left
+                              unwrapped, so the disabled cost is zero
+    CHATBOT_TRACE_FILE=path   Append every finished trace to a JSONL file;
+                              if a write fails, the export is logged and
+                              turned off for the rest of the process
+    CHATBOT_TRACE_BUFFER=200  Number of recent traces kept in memory
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+from typing import Dict, List, Optional
+
+# -------------------- CONFIGURATION --------------------
+
+_enabled = os.environ.get("CHATBOT_TRACING", "1").lower() not in ("0", "false", "off", "no")
+_export_path = os.environ.get("CHATBOT_TRACE_FILE") or None
+_lock = threading.Lock()
+# Serializes appends to the export file only, so a slow disk never holds up
+# _record_stage (and with it every traced call)
+_export_lock = threading.Lock()
+
+RECENT_TRACES = deque(maxlen=int(os.environ.get("CHATBOT_TRACE_BUFFER", "200")))
+STAGE_SAMPLES = 512
+
+_stages: Dict[str, Dict] = {}
+
+def is_enabled() -> bool:
+    return _enabled
+
+def set_enabled(enabled: bool):
+    """Switch tracing on or off at runtime (functions decorated while disabled stay unwrapped)."""
+    global _enabled
+    _enabled = enabled
+
+def set_export_path(path: Optional[str]):
+    """Set (or clear with None) the JSONL file finished traces are appended to."""
+    global _export_path
+    _export_path = path
+
+# -------------------- RECORDING --------------------
+
+def _record_stage(name: str, duration: float):
+    with _lock:
+        stage = _stages.get(name)
+        if stage is None:
+            stage = _stages[name] = {"count": 0, "total": 0.0, "max": 0.0,
+                                     "samples": deque(maxlen=STAGE_SAMPLES)}
+        stage["count"] += 1
+        stage["total"] += duration
+        if duration > stage["max"]:
+            stage["max"] = duration
+        stage["samples"].append(duration)
+
+class _Span:
+    __slots__ = ("name", "trace", "start")
+
+    def __init__(self, name: str, trace: Optional["Trace"] = None):
+        self.name = name
+        self.trace = trace
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.start
+        if self.trace is not None:
+            self.trace.add(self.name, self.start, duration)
+        else:
+            _record_stage(self.name, duration)
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+def span(name: str):
+    """Time a block as a stage: `with span("db.save_chat_message"): ...`."""
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(name)
+
+def traced(name: str):
+    """Decorator timing every call of a function as the given stage."""
+    def decorator(func):
+        if not _enabled:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record_stage(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+# -------------------- TRACES --------------------
+
+class Trace:
+    """A group of spans for one unit of work, e.g. one chat turn."""
+
+    __slots__ = ("name", "attrs", "start", "wall_start", "spans", "_finished")
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.spans: List[tuple] = []
+        self._finished = False
+
+    def span(self, name: str):
+        return _Span(name, self)
+
+    def add(self, name: str, start: float, duration: float):
+        """Record a span timed by the caller (perf_counter start, seconds)."""
+        _record_stage(name, duration)
+        self.spans.append((name, start - self.start, duration))
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        """Close the trace, store it in the ring buffer and export it."""
+        if self._finished:
+            return
+        self._finished = True
+        duration = time.perf_counter() - self.start
+        _record_stage(self.name, duration)
+        record = {
+            "name": self.name,
+            "timestamp": self.wall_start,
+            "duration": duration,
+            "attrs": self.attrs,
+            "spans": [{"name": n, "offset": o, "duration": d} for n, o, d in self.spans]
+        }
+        RECENT_TRACES.append(record)
+        if _export_path:
+            _export(json.dumps(record, default=str) + "\n")
+
+def _export(line: str):
+    # The export is optional: a failed write must never fail the chat turn
+    global _export_path
+    with _export_lock:
+        if not _export_path:
+            return
+        try:
+            with open(_export_path, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            logging.getLogger(__name__).warning("Trace export to %s failed, disabling it: %s", _export_path, e)
+            _export_path = None
+
+class _NoopTrace:
+    __slots__ = ()
+
+    def span(self, name: str):
+        return _NOOP_SPAN
+
+    def add(self, name: str, start: float, duration: float):
+        pass
+
+    def set(self, **attrs):
+        pass
+
+    def finish(self):
+        pass
+
+_NOOP_TRACE = _NoopTrace()
+
+def start_trace(name: str, **attrs):
+    """Start a trace; returns a no-op trace when tracing is disabled."""
+    if not _enabled:
+        return _NOOP_TRACE
+    return Trace(name, **attrs)
+
+# -------------------- REPORTING --------------------
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+def stage_summary() -> Dict[str, Dict]:
+    """Per-stage latency statistics in milliseconds."""
+    with _lock:
+        snapshot = {name: (s["count"], s["total"], s["max"], sorted(s["samples"]))
+                    for name, s in _stages.items()}
+    return {
+        name: {
+            "count": count,
+            "mean_ms": total / count * 1000,
+            "p50_ms": _percentile(samples, 50) * 1000,
+            "p95_ms": _percentile(samples, 95) * 1000,
+            "max_ms": peak * 1000
+        }
+        for name, (count, total, peak, samples) in sorted(snapshot.items())
+    }
+
+def model_breakdown() -> Dict[str, Dict[str, float]]:
+    """Mean time per stage (ms) for recent traces, grouped by model."""
+    totals: Dict[str, Dict[str, float]] = {}
+    counts: Dict[str, int] = {}
+    for record in list(RECENT_TRACES):
+        model = record["attrs"].get("model", "unknown")
+        counts[model] = counts.get(model, 0) + 1
+        stages = totals.setdefault(model, {})
+        stages["total"] = stages.get("total", 0.0) + record["duration"]
+        for s in record["spans"]:
+            stages[s["name"]] = stages.get(s["name"], 0.0) + s["duration"]
+    return {
+        model: {"turns": counts[model], **{name: value / counts[model] * 1000 for name, value in stages.items()}}
+        for model, stages in totals.items()
+    }
+
+def reset():
+    """Clear all recorded stages and traces."""
+    with _lock:
+        _stages.clear()
+        RECENT_TRACES.clear()
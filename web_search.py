@@ -0,0 +1,299 @@
+"""
+Web search post-processing pipeline.
+
+perform_search used to paste the search tool's raw output into the prompt.
+This module turns one user question into a compact, relevant context:
+
+1. generate_query_variants - 2-3 phrasings of the question
+2. fan_out                 - run the variants concurrently under a deadline
+3. parse_results           - normalise tool output into structured snippets
+4. dedupe                  - drop repeated URLs and near-identical text
+5. rank                    - score snippets against the question
+6. pack                    - keep the best snippets within a token budget
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, TypedDict
+
+import tracing
+
+# -------------------- CONFIGURATION --------------------
+
+MAX_VARIANTS = 3
+SEARCH_DEADLINE_S = 5.0
+TOKEN_BUDGET = 600
+MAX_SNIPPETS = 8
+DUPLICATE_SIMILARITY = 0.8
+# Snippets covering less than this share of the question's (IDF-weighted)
+# terms are dropped instead of packed
+MIN_RELEVANCE = 0.1
+# Threads shared by all searches; each search uses up to MAX_VARIANTS, so
+# the default serves 16 concurrent searches without queueing
+SEARCH_WORKERS = int(os.environ.get("CHATBOT_SEARCH_WORKERS", str(16 * MAX_VARIANTS)))
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "being",
+    "of", "in", "on", "at", "to", "for", "from", "by", "with", "about",
+    "and", "or", "but", "if", "then", "so", "than", "as", "into", "over",
+    "what", "who", "whom", "which", "when", "where", "why", "how",
+    "do", "does", "did", "can", "could", "would", "should", "will", "shall", "may", "might",
+    "i", "me", "my", "you", "your", "we", "our", "it", "its", "this", "that", "these", "those",
+    "please", "tell", "give", "show", "let", "know", "explain", "any", "some",
+}
+
+LEADING_PHRASES = [
+    "can you please", "could you please", "can you", "could you", "would you", "please",
+    "tell me about", "tell me", "search for", "search", "look up", "find out", "find",
+    "i want to know", "i'd like to know", "do you know", "what is", "what are", "who is",
+    "who are", "where is", "where are", "when did", "when was", "when is", "how to", "how do i",
+]
+
+class Snippet(TypedDict):
+    title: str
+    url: Optional[str]
+    text: str
+    score: float
+    hits: int
+
+# -------------------- QUERY VARIANTS --------------------
+
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9'+.#-]*")
+
+def _terms(text: str) -> List[str]:
+    """Lowercase content words of a text, stopwords removed."""
+    return [w.strip(".'") for w in _WORD_RE.findall(text.lower()) if w.strip(".'") not in STOPWORDS]
+
+def strip_question(query: str) -> str:
+    """Remove polite and interrogative lead-ins, e.g. "can you tell me what is X?" -> "X"."""
+    text = " ".join(query.lower().split())
+    changed = True
+    while changed:
+        changed = False
+        for phrase in LEADING_PHRASES:
+            if text.startswith(phrase + " "):
+                text = text[len(phrase):].strip(" ,")
+                changed = True
+    return text.rstrip("?!. ").strip()
+
+def generate_query_variants(query: str, max_variants: int = MAX_VARIANTS) -> List[str]:
+    """
+    Build up to max_variants distinct search queries for a user question.
+
+    Variants: the question without lead-ins, its content keywords, and the
+    original question as written.
+    """
+    candidates = [
+        strip_question(query),
+        " ".join(_terms(query)),
+        " ".join(query.split()).rstrip("?").strip(),
+    ]
+    variants = []
+    seen = set()
+    for candidate in candidates:
+        key = candidate.lower()
+        if candidate and key not in seen:
+            seen.add(key)
+            variants.append(candidate)
+    return variants[:max_variants] or [query]
+
+# -------------------- FAN-OUT --------------------
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="web-search")
+    return _executor
+
+def fan_out(run: Callable[[str], object], queries: List[str],
+            deadline_s: float = SEARCH_DEADLINE_S) -> List[object]:
+    """
+    Run a search function for every query concurrently.
+
+    Returns the raw outputs that finished within the deadline; failed or
+    late queries are dropped rather than delaying the reply. Late queries
+    that have not started yet are cancelled so they do not hold up other
+    searches.
+    """
+    futures = [_get_executor().submit(run, q) for q in queries]
+    done, not_done = wait(futures, timeout=deadline_s)
+    for future in not_done:
+        future.cancel()
+    outputs = []
+    for future in futures:
+        if future in done and future.exception() is None:
+            outputs.append(future.result())
+    return outputs
+
+# -------------------- PARSING --------------------
+
+_FIELD_RE = re.compile(r"(snippet|title|link): ")
+
+def _parse_string(raw: str) -> List[Dict]:
+    """Parse "snippet: ..., title: ..., link: ..." records or plain text."""
+    if "snippet: " in raw and "link: " in raw:
+        records = []
+        for chunk in re.split(r"\n|(?<=\S), (?=snippet: )", raw):
+            fields = {}
+            parts = _FIELD_RE.split(chunk)
+            for key, value in zip(parts[1::2], parts[2::2]):
+                fields[key] = value.strip().rstrip(",").strip()
+            if fields.get("snippet"):
+                records.append(fields)
+        return records
+    # Plain text (e.g. DuckDuckGoSearchRun): one snippet per sentence group
+    sentences = re.split(r"(?<=[.!?])\s+", raw.strip())
+    records = []
+    current = ""
+    for sentence in sentences:
+        current = f"{current} {sentence}".strip()
+        if len(current) >= 200:
+            records.append({"snippet": current})
+            current = ""
+    if current:
+        records.append({"snippet": current})
+    return records
+
+def parse_results(raw) -> List[Snippet]:
+    """Normalise search tool output (list of dicts or string) into snippets."""
+    if isinstance(raw, str):
+        records = _parse_string(raw)
+    elif isinstance(raw, list):
+        records = [r for r in raw if isinstance(r, dict)]
+    else:
+        records = []
+    snippets = []
+    for record in records:
+        text = " ".join(str(record.get("snippet") or record.get("body") or "").split())
+        if not text:
+            continue
+        snippets.append(Snippet(
+            title=" ".join(str(record.get("title") or "").split()),
+            url=record.get("link") or record.get("href") or record.get("url"),
+            text=text,
+            score=0.0,
+            hits=1
+        ))
+    return snippets
+
+# -------------------- DEDUP & RANKING --------------------
+
+def _normalize_url(url: str) -> str:
+    url = re.sub(r"^https?://(www\.)?", "", url.strip().lower())
+    return url.split("#")[0].rstrip("/")
+
+def _similarity(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def dedupe(snippets: List[Snippet], threshold: float = DUPLICATE_SIMILARITY) -> List[Snippet]:
+    """Merge snippets with the same URL or near-identical text, counting repeats as hits."""
+    kept: List[Snippet] = []
+    kept_terms: List[set] = []
+    by_url: Dict[str, Snippet] = {}
+    for snippet in snippets:
+        url_key = _normalize_url(snippet["url"]) if snippet["url"] else None
+        if url_key and url_key in by_url:
+            by_url[url_key]["hits"] += 1
+            continue
+        terms = set(_terms(snippet["text"]))
+        duplicate = next((i for i, t in enumerate(kept_terms) if _similarity(terms, t) >= threshold), None)
+        if duplicate is not None:
+            kept[duplicate]["hits"] += 1
+            continue
+        kept.append(snippet)
+        kept_terms.append(terms)
+        if url_key:
+            by_url[url_key] = snippet
+    return kept
+
+def rank(snippets: List[Snippet], question: str,
+         min_relevance: float = MIN_RELEVANCE) -> List[Snippet]:
+    """
+    Order snippets by relevance to the question.
+
+    Score is the IDF-weighted share of question terms found in the title
+    and text, plus a small bonus for results returned by several variants.
+    Snippets whose share is below min_relevance are dropped (unless the
+    question has no content words to match against).
+    """
+    query_terms = set(_terms(question))
+    if not snippets:
+        return []
+    documents = [set(_terms(f"{s['title']} {s['text']}")) for s in snippets]
+    n = len(documents)
+    idf = {t: 1.0 + (n / (1 + sum(t in d for d in documents))) for t in query_terms}
+    total = sum(idf.values()) or 1.0
+    relevant = []
+    for snippet, terms in zip(snippets, documents):
+        coverage = sum(weight for t, weight in idf.items() if t in terms) / total
+        snippet["score"] = coverage + 0.1 * (snippet["hits"] - 1)
+        if coverage >= min_relevance or not query_terms:
+            relevant.append(snippet)
+    return sorted(relevant, key=lambda s: s["score"], reverse=True)
+
+# -------------------- PACKING --------------------
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+def _format(index: int, snippet: Snippet) -> str:
+    header = f"[{index}] {snippet['title']}" if snippet["title"] else f"[{index}]"
+    if snippet["url"]:
+        header += f" ({snippet['url']})"
+    return f"{header}\n{snippet['text']}"
+
+def pack(snippets: List[Snippet], budget: int = TOKEN_BUDGET,
+         max_snippets: int = MAX_SNIPPETS) -> str:
+    """Format the best snippets as numbered sources within a token budget."""
+    blocks = []
+    used = 0
+    for snippet in snippets:
+        if len(blocks) >= max_snippets:
+            break
+        block = _format(len(blocks) + 1, snippet)
+        cost = estimate_tokens(block)
+        if used + cost > budget:
+            if blocks:
+                continue
+            # Always keep something: trim the top result to the budget
+            block = block[:budget * 4].rsplit(" ", 1)[0] + " ..."
+            cost = estimate_tokens(block)
+        blocks.append(block)
+        used += cost
+    return "\n\n".join(blocks)
+
+# -------------------- PIPELINE --------------------
+
+def search(question: str, run: Callable[[str], object],
+           deadline_s: float = SEARCH_DEADLINE_S, budget: int = TOKEN_BUDGET) -> str:
+    """
+    Full pipeline: variants -> concurrent search -> parse -> dedupe -> rank
+    (dropping irrelevant snippets) -> pack.
+
+    Args:
+        question: The user's message
+        run: Search function taking a query and returning raw tool output
+        deadline_s: Seconds to wait for the concurrent searches
+        budget: Approximate token budget for the packed context
+
+    Returns:
+        Packed search context, or an empty string if nothing usable came back
+    """
+    variants = generate_query_variants(question)
+    with tracing.span("search.fan_out"):
+        outputs = fan_out(run, variants, deadline_s)
+    with tracing.span("search.process"):
+        snippets = []
+        for output in outputs:
+            snippets.extend(parse_results(output))
+        return pack(rank(dedupe(snippets), question), budget)